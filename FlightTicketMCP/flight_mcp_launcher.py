@@ -5,6 +5,7 @@ FlightMCP 启动器
 """
 
 import os
+import site
 import sys
 
 # 确保当前目录在 Python 路径中
@@ -15,9 +16,17 @@ else:
     # 开发环境
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# 将 BASE_DIR 添加到 Python 路径
-if BASE_DIR not in sys.path:
+
+def _normalize_path(path):
+    """规范化路径（大小写、分隔符、符号链接），用于判断 sys.path 中是否已存在"""
+    return os.path.normcase(os.path.realpath(path))
+
+
+# 将 BASE_DIR 添加到 Python 路径最前面（按规范化路径去重）
+if _normalize_path(BASE_DIR) not in {_normalize_path(p) for p in sys.path if p}:
     sys.path.insert(0, BASE_DIR)
+# 处理 BASE_DIR 下的 .pth 文件（已在 sys.path 中时不会重复添加）
+site.addsitedir(BASE_DIR)
 
 # 导入并启动 MCP 服务
 from flight_ticket_mcp_server.main import main
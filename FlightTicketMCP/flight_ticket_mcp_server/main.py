@@ -287,11 +287,15 @@ def register_tools():
 
     # Flight transfer search tools
     @mcp.tool()
-    def getTransferFlightsByThreePlace(from_place: str="北京", transfer_place: str="香港", to_place: str="纽约",min_transfer_time: float = 2.0, max_transfer_time: float = 5.0):
+    async def getTransferFlightsByThreePlace(from_place: str="北京", transfer_place: str="香港", to_place: str="纽约",min_transfer_time: float = 2.0, max_transfer_time: float = 5.0):
         """航班中转路线查询 - 根据出发地、中转地、目的地、最小转机时间、最大转机时间查询中转航班信息，最小转机时间默认为2小时，最大转机时间默认为5小时"""
         logger.debug(f"调用航班中转查询工具：: from_place={from_place}, transfer_place={transfer_place}, to_place={to_place}")
-        logger.debug(f"最短换乘时间: min_transfer_time={from_place},默认2小时 最长换乘时间：max_transfer_time={max_transfer_time}, 默认5小时")
-        return flight_transfer_tools.getTransferFlightsByThreePlace(from_place, transfer_place, to_place, min_transfer_time, max_transfer_time)
+        logger.debug(f"最短换乘时间: min_transfer_time={min_transfer_time},默认2小时 最长换乘时间：max_transfer_time={max_transfer_time}, 默认5小时")
+        return await flight_transfer_tools.getTransferFlightsByThreePlaceAsync(
+            from_place, transfer_place, to_place,
+            min_transfer_time=min_transfer_time,
+            max_transfer_time=max_transfer_time
+        )
 
     # Weather query tools
     @mcp.tool()
@@ -5,18 +5,31 @@ Flight Transfer Tools - 航班中转查询工具
 支持 Chrome 和 Edge 浏览器（自动检测）
 """
 
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import cache, lru_cache
+from html.parser import HTMLParser
 from typing import Dict, List, Optional
+import asyncio
+import atexit
 import logging
 import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import weakref
+import requests
 from selenium import webdriver
 from selenium.webdriver import Keys
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.edge.service import Service as EdgeService
-import time
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 
 from ..core.flights import FlightSchedule, FlightPrice, Flight, SeatConfiguration, FlightTransfer
+from ..utils.cities_dict import lookup_iata_code
 
 # 初始化日志器
 logger = logging.getLogger(__name__)
@@ -35,27 +48,113 @@ BROWSER_PATHS = {
     ],
 }
 
+# PATH 中可能的浏览器可执行文件名
+BROWSER_EXECUTABLES = {
+    'chrome': ['chrome', 'google-chrome'],
+    'edge': ['msedge'],
+}
+
+
+@cache
 def get_available_browser_for_selenium() -> tuple:
     """
-    自动检测可用的浏览器（用于 Selenium）
+    自动检测可用的浏览器（用于 Selenium），结果在进程内缓存
 
-    优先级: Chrome > Edge
+    优先级: Chrome > Edge；同一浏览器先查 PATH，再查常见安装路径
 
     Returns:
         tuple: (浏览器类型 'chrome'/'edge', 浏览器路径) 或 (None, None)
     """
     for browser_type, paths in BROWSER_PATHS.items():
-        for path in paths:
-            if os.path.exists(path):
+        for executable in BROWSER_EXECUTABLES.get(browser_type, []):
+            path = shutil.which(executable)
+            if path:
                 logger.info(f"[Selenium] 检测到可用浏览器: {browser_type} -> {path}")
                 return (browser_type, path)
 
+        for path in paths:
+            try:
+                os.stat(path)
+            except OSError:
+                continue
+            logger.info(f"[Selenium] 检测到可用浏览器: {browser_type} -> {path}")
+            return (browser_type, path)
+
     logger.warning("[Selenium] 未检测到 Chrome 或 Edge 浏览器")
     return (None, None)
 
 # 在模块加载时检测
 SELENIUM_BROWSER_TYPE, SELENIUM_BROWSER_PATH = get_available_browser_for_selenium()
 
+# 同时运行的浏览器实例上限（每个抓取任务各自持有一个 WebDriver，WebDriver 不是线程安全的）
+MAX_CONCURRENT_BROWSERS = 5
+
+# 页面元素显式等待的超时时间（秒）
+PAGE_LOAD_TIMEOUT = 10
+
+# 城市页面地址中的三字码
+_LOCATION_CODE_RE = re.compile(r"[a-z]{3}")
+
+# 航班卡片文本格式（每项一行）：
+# 0 航班号 / 1 机型 / 3 出发时间 / 4 出发机场 / 7 到达时间 / 8 到达机场 / 13 "价格 最低~最高"
+_FLIGHT_CARD_RE = re.compile(
+    r"(?P<flight>[^\n]+)\n(?P<aircraft>[^\n]*)\n[^\n]*\n"
+    r"(?P<departure>\d{1,2}:\d{2})\n(?P<origin>[^\n]*)\n(?:[^\n]*\n){2}"
+    r"(?P<arrival>\d{1,2}:\d{2})\n(?P<destination>[^\n]*)\n(?:[^\n]*\n){4}"
+    r"[^ \n]* (?P<low>\d+(?:\.\d+)?)(?:~(?P<high>\d+(?:\.\d+)?))?"
+)
+
+# 在页面中批量提取航班卡片：可见文本、航司名、是否为中转航班
+_EXTRACT_FLIGHT_CARDS_JS = """
+return Array.from(document.querySelectorAll('.J_link')).map(function (tab) {
+    var img = tab.querySelector('.airline-box img');
+    return {
+        transfer: tab.querySelector('.transfer') !== null,
+        airline: img ? img.alt : '',
+        text: tab.innerText
+    };
+});
+"""
+
+# 静态页面请求的超时时间（秒）
+HTTP_TIMEOUT = 10
+
+# 静态页面的卡片布局是否可解析；一旦发现不符即关闭静态抓取，直接使用浏览器
+_static_layout_supported = True
+
+
+class _StaticLayoutMismatch(Exception):
+    """静态 HTML 中有航班卡片，但文本布局与 Selenium 看到的不一致"""
+
+
+# 静态页面抓取复用同一个 HTTP 会话（连接池 + keep-alive）
+_http_session = requests.Session()
+_http_session.headers.update({
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'),
+    'Accept-Language': 'zh-CN,zh;q=0.9',
+})
+
+
+# 所有浏览器实例共享的磁盘缓存目录（JS/CSS/字体等静态资源跨实例复用）
+# 注意：并发运行的实例不能共用同一个 user-data-dir，因此只共享磁盘缓存
+BROWSER_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'fmcp_browser_cache')
+
+
+def _apply_common_options(options):
+    """为 Chrome/Edge 设置通用的无头启动参数，减少冷启动和页面加载开销"""
+    options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_argument(f'--disk-cache-dir={BROWSER_CACHE_DIR}')
+    options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    # DOMContentLoaded 即返回，后续由 WebDriverWait 等待所需元素
+    options.page_load_strategy = 'eager'
+    return options
+
 
 def create_selenium_driver():
     """
@@ -65,20 +164,14 @@ def create_selenium_driver():
         WebDriver 实例
     """
     if SELENIUM_BROWSER_TYPE == 'chrome':
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
+        options = _apply_common_options(webdriver.ChromeOptions())
         if SELENIUM_BROWSER_PATH:
             options.binary_location = SELENIUM_BROWSER_PATH
         logger.info(f"[Selenium] 使用 Chrome 浏览器")
         return webdriver.Chrome(options=options)
 
     elif SELENIUM_BROWSER_TYPE == 'edge':
-        options = webdriver.EdgeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
+        options = _apply_common_options(webdriver.EdgeOptions())
         if SELENIUM_BROWSER_PATH:
             options.binary_location = SELENIUM_BROWSER_PATH
         logger.info(f"[Selenium] 使用 Edge 浏览器")
@@ -87,13 +180,84 @@ def create_selenium_driver():
     else:
         # 回退：尝试 Chrome（可能会失败）
         logger.warning("[Selenium] 未检测到浏览器，尝试使用默认 Chrome")
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
+        options = _apply_common_options(webdriver.ChromeOptions())
         return webdriver.Chrome(options=options)
 
 
+class DriverPool:
+    """
+    WebDriver 池：复用已启动的无头浏览器，避免每次抓取都冷启动 Chrome/Edge
+
+    池中最多同时存在 max_size 个浏览器实例，超出时 acquire() 会阻塞等待。
+    """
+
+    def __init__(self, max_size: int = MAX_CONCURRENT_BROWSERS):
+        self._idle: queue.Queue = queue.Queue(maxsize=max_size)
+        self._slots = threading.BoundedSemaphore(max_size)
+        # 所有存活的实例（含借出中的），关闭时确保每个浏览器进程都被 quit
+        self._live = weakref.WeakSet()
+        self._closed = False
+
+    @contextmanager
+    def acquire(self):
+        """借出一个 WebDriver，用完自动归还；任务异常时丢弃该实例"""
+        self._slots.acquire()
+        try:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = create_selenium_driver()
+                self._live.add(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+        reusable = False
+        try:
+            yield driver
+            reusable = True
+        finally:
+            self.release(driver, reusable)
+            self._slots.release()
+
+    def release(self, driver, reusable: bool = True):
+        """归还 WebDriver：清理状态后放回池中，无法复用时直接退出浏览器"""
+        if reusable and not self._closed:
+            try:
+                driver.delete_all_cookies()
+                driver.get("about:blank")
+                self._idle.put_nowait(driver)
+                return
+            except Exception as e:
+                logger.debug(f"[Selenium] WebDriver 无法复用，将关闭: {e}")
+        self._quit(driver)
+
+    def shutdown(self):
+        """关闭池中所有浏览器实例（包括仍被借出的），避免残留 chromedriver/浏览器进程"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+        for driver in list(self._live):
+            self._quit(driver)
+
+    def _quit(self, driver):
+        """quit() 会结束 chromedriver 及浏览器进程；close() 只关闭当前窗口，会泄漏进程"""
+        self._live.discard(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+# 全局 WebDriver 池，进程退出时关闭所有浏览器
+driver_pool = DriverPool()
+atexit.register(driver_pool.shutdown)
+
+
 def getTransferFlightsByThreePlace(from_place: str, transfer_place: str, to_place: str,departure_date: str = None, min_transfer_time: float = 2.0,
                                 max_transfer_time: float = 5.0) -> List[FlightTransfer]:
     """
@@ -103,7 +267,7 @@ def getTransferFlightsByThreePlace(from_place: str, transfer_place: str, to_plac
         from_place (str): 出发地城市或机场
         transfer_place (str): 中转地城市或机场
         to_place (str): 目的地城市或机场
-        departure_date (str): 出发日期（可选）
+        departure_date (str): 出发日期（可选，默认为今天，格式 YYYY-MM-DD）
         min_transfer_time (float): 最小中转时间（单位：小时），默认 2 小时
         max_transfer_time (float): 最大中转时间（单位：小时），默认 5 小时
 
@@ -112,44 +276,51 @@ def getTransferFlightsByThreePlace(from_place: str, transfer_place: str, to_plac
     """
     logger.info(f"开始查询中转航班: {from_place} -> {transfer_place} -> {to_place}")
 
+    # 出发日期在查询开始时确定一次，所有中转方案共用
+    if not departure_date:
+        departure_date = datetime.today().strftime("%Y-%m-%d")
+
     try:
-        # 获取所有城市的三字码
-        from_code = _get_location_codev2(from_place)
-        transfer_code = _get_location_codev2(transfer_place)
-        to_code = _get_location_codev2(to_place)
+        # 并行获取所有城市的三字码（I/O 密集，线程即可获得近线性加速）
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            from_code, transfer_code, to_code = executor.map(
+                _get_location_codev2, (from_place, transfer_place, to_place)
+            )
 
         logger.info(f"三字码: {from_code} -> {transfer_code} -> {to_code}")
 
-        # 获取两段行程列表
-        first_trips = _get_direct_airline(from_code, transfer_code)
-        first_trips = first_trips or []
-        after_trips = _get_direct_airline(transfer_code, to_code)
-        after_trips = after_trips or []
+        # 并行获取两段行程列表
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first_future = executor.submit(_get_direct_airline, from_code, transfer_code)
+            after_future = executor.submit(_get_direct_airline, transfer_code, to_code)
+            first_trips = first_future.result() or []
+            after_trips = after_future.result() or []
 
         logger.info(f"第一段航班: {len(first_trips)}, 第二段航班: {len(after_trips)}")
 
-        # 计算换乘路线
-        select_trips = []
-        index = 1
-        for trip1 in first_trips:
-            arrival_time = trip1.schedule.arrival_time
-            arrival_time = datetime.strptime(arrival_time, "%H:%M").time()
-            arrival_time = datetime.combine(datetime.today(), arrival_time)
-            for trip2 in after_trips:
-                departure_time = trip2.schedule.departure_time
-                departure_time = datetime.strptime(departure_time, "%H:%M").time()
-                departure_time = datetime.combine(datetime.today(), departure_time)
-                if (departure_time - arrival_time > timedelta(hours=min_transfer_time)
-                        and departure_time - arrival_time < timedelta(hours=max_transfer_time)):
-                    transfer = FlightTransfer(
-                        transfer_id=f"{index}",
-                        first_flight=trip1,
-                        second_flight=trip2,
-                        departure_date=departure_date,
-                        transfer_time=round((departure_time - arrival_time).total_seconds() / 3600, 3)
-                    )
-                    index += 1
-                    select_trips.append(transfer)
+        # 计算换乘路线：时刻统一换算为分钟数，每个航班只解析一次
+        min_wait = min_transfer_time * 60
+        max_wait = max_transfer_time * 60
+        arrival_minutes = [_hm_to_minutes(trip.schedule.arrival_time) for trip in first_trips]
+        departure_minutes = [_hm_to_minutes(trip.schedule.departure_time) for trip in after_trips]
+
+        pairs = [
+            (trip1, trip2, departure - arrival)
+            for trip1, arrival in zip(first_trips, arrival_minutes)
+            for trip2, departure in zip(after_trips, departure_minutes)
+            if min_wait < departure - arrival < max_wait
+        ]
+        # 两段航班均为已校验的 Flight 实例，用 model_construct 跳过重复的字段校验
+        select_trips = [
+            FlightTransfer.model_construct(
+                transfer_id=str(index),
+                first_flight=trip1,
+                second_flight=trip2,
+                departure_date=departure_date,
+                transfer_time=round(wait / 60, 3)
+            )
+            for index, (trip1, trip2, wait) in enumerate(pairs, 1)
+        ]
 
         logger.info(f"查询到 {len(select_trips)} 条中转航班")
         return select_trips
@@ -158,81 +329,96 @@ def getTransferFlightsByThreePlace(from_place: str, transfer_place: str, to_plac
         return []
 
 
-def _get_location_code(place: str) -> str:
-    '''
-    获取城市对应的机场三字码（IATA Code）。
-    Args:
-        place (str): 城市名称，例如 "北京"、"Shanghai"
-    Returns:
-        Optional[str]: 对应的机场三字码，如 "PEK" 或 "PVG"；如果找不到则返回 None。
-    '''
-
-    driver = create_selenium_driver()
-    try:
-        url = 'http://szdm.00cha.net/'
-
-        driver.get(url)
-        time.sleep(1)
+async def getTransferFlightsByThreePlaceAsync(from_place: str, transfer_place: str, to_place: str,
+                                             departure_date: str = None, min_transfer_time: float = 2.0,
+                                             max_transfer_time: float = 5.0) -> List[FlightTransfer]:
+    """
+    getTransferFlightsByThreePlace 的异步版本
 
-        input_box = driver.find_element(By.NAME, "txtname")
-        input_box.clear()
-        input_box.send_keys(place)
+    抓取过程是阻塞的，放到线程中执行，避免阻塞 MCP 服务的事件循环，
+    使多个工具调用可以在服务端并发处理。
+    """
+    return await asyncio.to_thread(
+        getTransferFlightsByThreePlace,
+        from_place,
+        transfer_place,
+        to_place,
+        departure_date=departure_date,
+        min_transfer_time=min_transfer_time,
+        max_transfer_time=max_transfer_time,
+    )
 
-        search_button = driver.find_element(By.ID, "btnQuery")
-        search_button.click()
-        time.sleep(1)
 
-        results = driver.find_elements(By.CLASS_NAME, "tabled")
-      
-        code = ""
-        if len(results) == 0:
-            logger.warning("输入城市名错误！")
-        else:
-            text = results[0].text
-            code_array = [line.strip().split() for line in text.strip().splitlines()][1:]
-            country = code_array[0][-1]
-            select_array = [item for item in code_array if item[-1] == country]
-            sorted_codes = sorted(select_array, key=len)
-            code = sorted_codes[0][0]
-            return code[:3]
-    except Exception as e:
-        logger.warning(f"查询{place}城市三字码错误" + str(e))
-    finally:
-        driver.close()
+def _hm_to_minutes(hm: str) -> int:
+    """将 "HH:MM" 格式的时刻换算为当天零点起的分钟数"""
+    hours, minutes = hm.split(":")
+    return int(hours) * 60 + int(minutes)
 
 
 def _get_location_codev2(place: str) -> str:
     '''
     获取城市对应的机场三字码（IATA Code）。
+    以网站自身的城市查询结果为准（与航线页面地址一致），网页查询失败时才回退到内置城市字典。
     Args:
         place (str): 城市名称，例如 "北京"
     Returns:
         Optional[str]: 对应的机场三字码，如 "PEK" 或 "PVG"；如果找不到则返回 None。
     '''
-    driver = None
     try:
-        driver = create_selenium_driver()
+        return _scrape_location_code(place)
+    except Exception as e:
+        code = lookup_iata_code(place)
+        if code:
+            logger.info(f"网页查询{place}城市三字码失败，使用城市字典中的 {code}: {str(e)}")
+        else:
+            logger.warning(f"查询{place}城市三字码错误: {str(e)}")
+        return code
+
+
+@lru_cache(maxsize=512)
+def _scrape_location_code(place: str) -> str:
+    '''
+    通过 chahangxian.com 网页搜索获取城市三字码（城市字典未命中时的回退方案）。
+    结果按城市名缓存；查询失败时直接抛出异常，不会写入缓存。
+    Args:
+        place (str): 城市名称
+    Returns:
+        str: 机场三字码
+    '''
+    with driver_pool.acquire() as driver:
         url = 'https://www.chahangxian.com/'
         driver.get(url)
-        time.sleep(2)
+        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            EC.presence_of_element_located((By.CLASS_NAME, "search"))
+        )
 
         search_box = driver.find_element(By.CLASS_NAME, "search")
         input_box = search_box.find_element(By.NAME, "keyword")
         input_box.clear()
         input_box.send_keys(place)
         input_box.send_keys(Keys.ENTER)
-        time.sleep(2)
-        result = driver.current_url.split("/")[-2]
-        return result
-    except Exception as e:
-        logger.warning(f"查询{place}城市三字码错误: {str(e)}")
+        # 等待跳转到最终的城市页面：URL 变化可能先经过中间页面，
+        # 因此一直等到 URL 中出现合法的三字码为止
+        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            lambda d: d.current_url != url and _location_code_from_url(d.current_url)
+        )
+        code = _location_code_from_url(driver.current_url)
+        if code is None:
+            # 抛出异常而不是返回，避免错误的三字码被 lru_cache 缓存
+            raise ValueError(f"城市页面地址中没有有效的三字码: {driver.current_url}")
+        return code
+
+
+def _location_code_from_url(url: str) -> Optional[str]:
+    '''
+    从城市页面地址（如 https://www.chahangxian.com/pek/）中提取三字码
+    :return: 小写三字码；地址格式不符时返回 None
+    '''
+    parts = url.split("/")
+    if len(parts) < 2:
         return None
-    finally:
-        if driver:
-            try:
-                driver.close()
-            except:
-                pass
+    code = parts[-2]
+    return code if _LOCATION_CODE_RE.fullmatch(code) else None
 
 
 def _get_direct_airline(from_code: str, to_code: str) -> list:
@@ -242,66 +428,241 @@ def _get_direct_airline(from_code: str, to_code: str) -> list:
     :param to_code: 目的地机场代码
     :return: 航班列表
     '''
-    driver = None
     try:
-        driver = create_selenium_driver()
-        url = f"https://www.chahangxian.com/{from_code.lower()}-{to_code.lower()}/"
-        driver.get(url)
-        time.sleep(1)
-
-        tabs = driver.find_elements(By.CLASS_NAME, "J_link")
-        if len(tabs) == 0:
-            logger.warning(f"航班为空 {from_code}-{to_code}")
-            return []
-
-        result = []
-        index = 1
-        for tab in tabs:
-            transfer = tab.find_elements(By.CLASS_NAME, "transfer")
-            if len(transfer) == 0:
-                box = tab.find_element(By.CLASS_NAME, "airline-box")
-                img = box.find_element(By.TAG_NAME, 'img')
-                airline = img.get_attribute('alt')
-                message = tab.text.splitlines()
-                schedule = FlightSchedule(
-                    departure_time=message[3],
-                    arrival_time=message[7],
-                    duration="",
-                    timezone=""
-                )
-                mPrice = message[13].split(" ")[1].split("~")
-                price = FlightPrice(
-                    economy=float(mPrice[0]),
-                    business=float(mPrice[-1]),
-                    first=0,
-                )
-                flight = Flight(
-                    flight_id=f"{index}",
-                    flight_number=message[0],
-                    airline=airline,
-                    aircraft=message[1],
-                    origin=message[4],
-                    destination=message[8],
-                    schedule=schedule,
-                    price=price,
-                    seat_config=SeatConfiguration(),
-                    services={},
-                )
-                index += 1
-                result.append(flight)
-
-        if len(result) == 0:
-            logger.warning(f"没有直飞航班 {from_code}-{to_code}")
-        return result
+        rows = _fetch_direct_airline_rows(from_code.lower(), to_code.lower())
     except Exception as e:
         logger.warning(f"直飞查询失败 {from_code}-{to_code}: {str(e)}")
         return []
-    finally:
-        if driver:
-            try:
-                driver.close()
-            except:
-                pass
+
+    if len(rows) == 0:
+        logger.warning(f"没有直飞航班 {from_code}-{to_code}")
+        return []
+
+    # 每次调用都基于缓存的原始数据重建 Flight，避免调用方修改共享对象
+    result = []
+    for index, row in enumerate(rows, 1):
+        flight_number, aircraft, airline, origin, destination, departure_time, arrival_time, economy, business = row
+        result.append(Flight(
+            flight_id=f"{index}",
+            flight_number=flight_number,
+            airline=airline,
+            aircraft=aircraft,
+            origin=origin,
+            destination=destination,
+            schedule=FlightSchedule(
+                departure_time=departure_time,
+                arrival_time=arrival_time,
+                duration="",
+                timezone=""
+            ),
+            price=FlightPrice(
+                economy=economy,
+                business=business,
+                first=0,
+            ),
+            seat_config=SeatConfiguration(),
+            services={},
+        ))
+    return result
+
+
+@lru_cache(maxsize=1024)
+def _fetch_direct_airline_rows(from_code: str, to_code: str) -> tuple:
+    '''
+    抓取两地之间直飞航班的原始数据，结果按航线缓存；抓取失败时抛出异常，不会写入缓存。
+    优先直接请求静态 HTML 解析，页面被拦截或没有航班列表时回退到 Selenium。
+    :param from_code: 出发地机场代码（小写）
+    :param to_code: 目的地机场代码（小写）
+    :return: 元组，每项为 (航班号, 机型, 航司, 出发机场, 到达机场, 出发时间, 到达时间, 经济舱价, 商务舱价)
+    '''
+    global _static_layout_supported
+    url = f"https://www.chahangxian.com/{from_code}-{to_code}/"
+    if _static_layout_supported:
+        try:
+            rows = _fetch_direct_airline_rows_http(url)
+            if rows is not None:
+                return rows
+            logger.info(f"静态页面未包含航班列表，回退到浏览器抓取 {from_code}-{to_code}")
+        except _StaticLayoutMismatch as e:
+            # 页面结构与预期不符时，之后的航线不再先做一次注定失败的静态请求
+            _static_layout_supported = False
+            logger.warning(f"静态页面布局无法解析，后续直接使用浏览器抓取: {str(e)}")
+        except Exception as e:
+            logger.info(f"静态页面抓取失败，回退到浏览器抓取 {from_code}-{to_code}: {str(e)}")
+    return _fetch_direct_airline_rows_selenium(url, from_code, to_code)
+
+
+def _fetch_direct_airline_rows_http(url: str) -> Optional[tuple]:
+    '''
+    直接请求航线页面并解析静态 HTML（无需启动浏览器）
+    :return: 航班原始数据元组；页面中没有航班列表时返回 None
+    '''
+    response = _http_session.get(url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+
+    parser = _DirectAirlineHTMLParser()
+    parser.feed(response.text)
+    parser.close()
+    if len(parser.tabs) == 0:
+        return None
+
+    direct_tabs = [tab for tab in parser.tabs if not tab["transfer"]]
+    rows = tuple(
+        row for row in (
+            _build_direct_airline_row("\n".join(tab["lines"]), tab["airline"]) for tab in direct_tabs
+        )
+        if row
+    )
+    if direct_tabs and not rows:
+        # 静态文本布局与预期不符，交给浏览器渲染后再解析
+        raise _StaticLayoutMismatch(f"{len(direct_tabs)} 张直飞卡片均无法解析: {url}")
+    return rows
+
+
+def _fetch_direct_airline_rows_selenium(url: str, from_code: str, to_code: str) -> tuple:
+    '''
+    使用 Selenium 渲染航线页面后抓取直飞航班（静态抓取失败时的回退方案）
+    页面中没有任何航班卡片时抛出 ValueError，由调用方按查询失败处理
+    '''
+    with driver_pool.acquire() as driver:
+        driver.get(url)
+        # 航班列表出现即可解析；没有航班的航线则等到页面加载完成
+        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            lambda d: d.find_elements(By.CLASS_NAME, "J_link")
+            or d.execute_script("return document.readyState") == "complete"
+        )
+
+        # 一次 execute_script 批量取回所有卡片，避免逐个元素查询的 WebDriver 往返
+        cards = driver.execute_script(_EXTRACT_FLIGHT_CARDS_JS)
+        if len(cards) == 0:
+            # 验证码页、脚本未渲染完等情况同样没有卡片，抛出异常以免空结果被长期缓存
+            raise ValueError(f"页面中没有航班卡片 {from_code}-{to_code}")
+
+        rows = []
+        for card in cards:
+            if not card["transfer"]:
+                row = _build_direct_airline_row(card["text"], card["airline"] or "")
+                if row:
+                    rows.append(row)
+        return tuple(rows)
+
+
+def _build_direct_airline_row(text: str, airline: str) -> Optional[tuple]:
+    '''
+    将航班卡片的文本解析为直飞航班原始数据
+    :param text: 航班卡片的可见文本（按行分隔）
+    :param airline: 航空公司名称
+    :return: 航班原始数据；文本格式不符时返回 None
+    '''
+    match = _FLIGHT_CARD_RE.match(text)
+    if not match:
+        logger.debug(f"无法解析航班卡片: {text[:50]!r}")
+        return None
+    economy = float(match.group("low"))
+    business = float(match.group("high") or economy)
+    return (
+        match.group("flight"),
+        match.group("aircraft"),
+        airline,
+        match.group("origin"),
+        match.group("destination"),
+        match.group("departure"),
+        match.group("arrival"),
+        economy,
+        business,
+    )
+
+
+class _DirectAirlineHTMLParser(HTMLParser):
+    """
+    从航线页面的静态 HTML 中提取航班卡片（class 含 J_link 的元素）
+
+    每张卡片记录：可见文本行、airline-box 中图片的 alt（航司名）、是否为中转航班。
+    文本按浏览器 innerText 的规则分行（Selenium 路径解析的就是 innerText）：
+    块级元素和 <br> 换行，相邻的行内元素拼在同一行，空白折叠为一个空格，空行丢弃。
+    """
+
+    _VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+                  "link", "meta", "source", "track", "wbr"}
+
+    # 默认样式为块级（innerText 中独占一行）的元素
+    _BLOCK_TAGS = {"address", "article", "aside", "blockquote", "dd", "div", "dl", "dt",
+                   "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3",
+                   "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre",
+                   "section", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "ul"}
+
+    def __init__(self):
+        super().__init__()
+        self.tabs: List[Dict] = []
+        self._tab: Optional[Dict] = None
+        self._line: List[str] = []
+        self._depth = 0
+        self._airline_box_depth: Optional[int] = None
+        self._skip_depth: Optional[int] = None
+
+    def _flush_line(self):
+        """结束当前行：折叠空白后写入卡片，空行丢弃"""
+        text = " ".join("".join(self._line).split())
+        if text:
+            self._tab["lines"].append(text)
+        self._line = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+
+        if self._tab is None:
+            if "J_link" in classes:
+                self._tab = {"lines": [], "airline": "", "transfer": False}
+                self._line = []
+                self._depth = 1
+            return
+
+        if tag in self._BLOCK_TAGS or tag == "br":
+            self._flush_line()
+
+        if tag in self._VOID_TAGS:
+            if tag == "img" and self._airline_box_depth is not None and not self._tab["airline"]:
+                self._tab["airline"] = attrs.get("alt") or ""
+            return
+
+        self._depth += 1
+        if "transfer" in classes:
+            self._tab["transfer"] = True
+        if "airline-box" in classes and self._airline_box_depth is None:
+            self._airline_box_depth = self._depth
+        if tag in ("script", "style") and self._skip_depth is None:
+            self._skip_depth = self._depth
+
+    def handle_endtag(self, tag):
+        if self._tab is None or tag in self._VOID_TAGS:
+            return
+
+        if tag in self._BLOCK_TAGS:
+            self._flush_line()
+        if self._airline_box_depth == self._depth:
+            self._airline_box_depth = None
+        if self._skip_depth == self._depth:
+            self._skip_depth = None
+        self._depth -= 1
+
+        if self._depth == 0:
+            self._flush_line()
+            self.tabs.append(self._tab)
+            self._tab = None
+
+    def handle_data(self, data):
+        if self._tab is None or self._skip_depth is not None:
+            return
+        self._line.append(data)
+
+
+def clear_flight_caches():
+    """清空三字码和直飞航班的抓取缓存（主要用于测试或强制刷新），并重新启用静态抓取"""
+    global _static_layout_supported
+    _static_layout_supported = True
+    _scrape_location_code.cache_clear()
+    _fetch_direct_airline_rows.cache_clear()
 
 
 if __name__ == '__main__':
@@ -470,6 +470,27 @@ CITY_NAME_TO_CODE = {
     key.split('(')[0]: value for key, value in CITIES_DICT.items()
 }
 
+# 规范化(小写)的 城市/代码 -> 机场代码 查找表
+# 优先级：完整格式 > 城市名 > 机场代码，与 get_airport_code 保持一致
+CITY_TO_IATA = {
+    **{code: code for code in AIRPORT_TO_CITY},
+    **{name.lower(): code for name, code in CITY_NAME_TO_CODE.items()},
+    **{full_name.lower(): code for full_name, code in CITIES_DICT.items()},
+}
+
+
+def lookup_iata_code(place):
+    """
+    离线查找城市对应的机场代码(小写)，无需网络和浏览器
+
+    只做精确匹配（完整格式、城市名或机场代码，不区分大小写），结果与 get_airport_code 一致。
+
+    Returns:
+        机场代码(小写)，找不到时返回 None
+    """
+    return CITY_TO_IATA.get(place.strip().lower())
+
+
 def get_airport_code(city_input):
     """
     根据输入获取机场代码(小写)
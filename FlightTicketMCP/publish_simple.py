@@ -3,40 +3,63 @@
 简化的发布脚本 - 避免编码问题
 """
 
+import glob
 import os
+import stat
 import sys
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
-def run_cmd(cmd):
-    """简单运行命令"""
-    print(f"Running: {cmd}")
-    result = os.system(cmd)
-    if result != 0:
-        print(f"Command failed: {cmd}")
+BUILD_DIRS = ["dist", "build", "flight_ticket_mcp_server.egg-info"]
+
+def run_cmd(args, env=None):
+    """简单运行命令（不经过 shell，参数按列表传递）"""
+    print(f"Running: {' '.join(args)}")
+    result = subprocess.run(args, env=env)
+    if result.returncode != 0:
+        print(f"Command failed: {' '.join(args)}")
         sys.exit(1)
     print("Success!")
 
+def _on_rmtree_exc(func, path, exc):
+    """目录不存在时忽略；Windows 下只读文件去掉只读属性后重试一次"""
+    if isinstance(exc, FileNotFoundError):
+        return
+    try:
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+    except OSError:
+        pass
+
+def remove_dir(path):
+    # Python 3.12 起 onerror 已弃用，改用直接传入异常对象的 onexc
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=_on_rmtree_exc)
+    else:
+        shutil.rmtree(path, onerror=lambda func, p, exc_info: _on_rmtree_exc(func, p, exc_info[1]))
+
+def twine_env(token):
+    """通过环境变量传递 token，避免出现在命令行和进程列表中"""
+    return {**os.environ, "TWINE_USERNAME": "__token__", "TWINE_PASSWORD": token}
+
 def main():
     print("Flight Ticket MCP Server 发布脚本")
     print("=" * 40)
     
     # 清理
     print("\n1. 清理构建目录...")
-    if os.path.exists('dist'):
-        shutil.rmtree('dist')
-    if os.path.exists('build'):
-        shutil.rmtree('build')
-    if os.path.exists('flight_ticket_mcp_server.egg-info'):
-        shutil.rmtree('flight_ticket_mcp_server.egg-info')
+    with ThreadPoolExecutor(max_workers=len(BUILD_DIRS)) as executor:
+        list(executor.map(remove_dir, BUILD_DIRS))
     
     # 构建
     print("\n2. 构建包...")
-    run_cmd("python -m build")
+    run_cmd([sys.executable, "-m", "build"])
     
     # 检查
     print("\n3. 检查包...")
-    run_cmd("twine check dist/*")
+    dist_files = glob.glob(os.path.join("dist", "*"))
+    run_cmd([sys.executable, "-m", "twine", "check", *dist_files])
     
     print("\n4. 准备上传...")
     choice = input("选择上传目标 (1=测试PyPI, 2=正式PyPI): ")
@@ -44,11 +67,12 @@ def main():
     if choice == "1":
         print("上传到测试PyPI...")
         token = input("请输入TestPyPI API token: ")
-        run_cmd(f'twine upload --repository testpypi dist/* -u __token__ -p "{token}"')
+        run_cmd([sys.executable, "-m", "twine", "upload", "--repository", "testpypi", *dist_files],
+                env=twine_env(token))
     elif choice == "2":
         print("上传到正式PyPI...")
         token = input("请输入PyPI API token: ")
-        run_cmd(f'twine upload dist/* -u __token__ -p "{token}"')
+        run_cmd([sys.executable, "-m", "twine", "upload", *dist_files], env=twine_env(token))
     else:
         print("无效选择")
 
@@ -0,0 +1,48 @@
+"""
+城市字典三字码查询测试
+"""
+
+import pytest
+
+from flight_ticket_mcp_server.utils.cities_dict import (
+    CITIES_DICT,
+    CITY_NAME_TO_CODE,
+    get_airport_code,
+    lookup_iata_code,
+)
+
+
+class TestLookupIataCode:
+    """lookup_iata_code 离线查询测试"""
+
+    @pytest.mark.parametrize(
+        "place, expected",
+        [
+            ("北京", "bjs"),
+            ("上海", "sha"),
+            ("曼谷", "bkk"),
+            ("  北京  ", "bjs"),
+        ],
+    )
+    def test_chinese_city_name(self, place, expected):
+        assert lookup_iata_code(place) == expected
+
+    def test_full_name_with_code(self):
+        assert lookup_iata_code("迪拜(DXB)") == "dxb"
+
+    @pytest.mark.parametrize("code", ["SHA", "sha", " bkk "])
+    def test_raw_iata_code(self, code):
+        assert lookup_iata_code(code) == code.strip().lower()
+
+    @pytest.mark.parametrize("place", ["bj", "ny", "b"])
+    def test_prefix_is_not_completed(self, place):
+        assert lookup_iata_code(place) is None
+
+    @pytest.mark.parametrize("place", ["不存在的城市", "xyz", ""])
+    def test_miss_returns_none(self, place):
+        assert lookup_iata_code(place) is None
+
+    def test_consistent_with_get_airport_code(self):
+        """查找表必须与 get_airport_code 的结果一致，避免查询被发到错误的城市"""
+        for name in list(CITIES_DICT) + list(CITY_NAME_TO_CODE):
+            assert lookup_iata_code(name) == get_airport_code(name), name
@@ -0,0 +1,225 @@
+"""
+中转航班工具的解析函数测试（不需要浏览器和网络）
+"""
+
+from contextlib import contextmanager
+
+import pytest
+
+from flight_ticket_mcp_server.tools import flight_transfer_tools as ftt
+
+
+class TestLocationCodeFromUrl:
+    """城市页面地址中的三字码提取"""
+
+    @pytest.mark.parametrize(
+        "url, expected",
+        [
+            ("https://www.chahangxian.com/pek/", "pek"),
+            ("https://www.chahangxian.com/sha/", "sha"),
+        ],
+    )
+    def test_city_page(self, url, expected):
+        assert ftt._location_code_from_url(url) == expected
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            "https://www.chahangxian.com/",
+            "https://www.chahangxian.com/search/",
+            "https://www.chahangxian.com/search?keyword=%E5%8C%97%E4%BA%AC",
+            "https://www.chahangxian.com/PEK/",
+            "https://www.chahangxian.com/pek-sha/",
+            "",
+        ],
+    )
+    def test_intermediate_or_invalid_page(self, url):
+        assert ftt._location_code_from_url(url) is None
+
+
+class TestGetLocationCode:
+    """三字码查询以网站结果为准，城市字典只作回退"""
+
+    def test_site_result_takes_precedence(self, monkeypatch):
+        monkeypatch.setattr(ftt, "_scrape_location_code", lambda place: "pek")
+        assert ftt._get_location_codev2("北京") == "pek"
+
+    def test_dictionary_used_when_site_lookup_fails(self, monkeypatch):
+        def fail(place):
+            raise ValueError("未找到城市页面")
+
+        monkeypatch.setattr(ftt, "_scrape_location_code", fail)
+        assert ftt._get_location_codev2("北京") == "bjs"
+        assert ftt._get_location_codev2("不存在的城市") is None
+
+
+# 按 J_link 卡片结构手工构造的航线页面片段（合成样例，并非站点原始页面）：
+# 卡片内混用块级元素、行内元素、<br> 和多余空白，用来核对静态解析的分行与浏览器 innerText 一致
+SAMPLE_ROUTE_HTML = """
+<ul class="flight-list">
+  <li class="J_link">
+    <div class="airline-box"><img src="ca.png" alt="中国国际航空"><span>CA1501</span></div>
+    <div>波音737(中)</div>
+    <div>准点率 <b>95%</b></div>
+    <div class="dep"><div>08:00</div><p>首都机场
+        T3</p></div>
+    <div>2小时15分</div><div>直飞</div>
+    <div class="arr"><div>10:15</div><p>虹桥机场T2</p></div>
+    <div>有餐食</div><div>共享航班</div><div>周一至周日</div><div>2024-01-01起</div>
+    <div class="price"><span>经济舱</span> <em>520</em>~<em>1880</em><br></div>
+    <script>var x = "<div>ignored</div>";</script>
+  </li>
+  <li class="J_link">
+    <div class="airline-box"><img src="mu.png" alt="东方航空"><span>MU5101</span></div>
+    <div class="transfer">经停</div>
+  </li>
+</ul>
+"""
+
+# 浏览器对第一张卡片执行 innerText 得到的文本行（Selenium 路径解析的输入）
+SAMPLE_CARD_INNER_TEXT = [
+    "CA1501", "波音737(中)", "准点率 95%", "08:00", "首都机场 T3", "2小时15分", "直飞",
+    "10:15", "虹桥机场T2", "有餐食", "共享航班", "周一至周日", "2024-01-01起", "经济舱 520~1880",
+]
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+class TestDirectAirlineHTMLParser:
+    """静态 HTML 解析与 Selenium innerText 路径的一致性"""
+
+    def _parse(self, html):
+        parser = ftt._DirectAirlineHTMLParser()
+        parser.feed(html)
+        parser.close()
+        return parser.tabs
+
+    def test_lines_match_inner_text(self):
+        tabs = self._parse(SAMPLE_ROUTE_HTML)
+        assert len(tabs) == 2
+        assert tabs[0]["lines"] == SAMPLE_CARD_INNER_TEXT
+        assert tabs[0]["airline"] == "中国国际航空"
+        assert tabs[0]["transfer"] is False
+        assert tabs[1]["transfer"] is True
+
+    def test_static_rows_match_selenium_rows(self, monkeypatch):
+        monkeypatch.setattr(ftt._http_session, "get", lambda url, timeout: _FakeResponse(SAMPLE_ROUTE_HTML))
+        expected = ftt._build_direct_airline_row("\n".join(SAMPLE_CARD_INNER_TEXT), "中国国际航空")
+        assert expected is not None
+        assert ftt._fetch_direct_airline_rows_http("https://www.chahangxian.com/bjs-sha/") == (expected,)
+
+    def test_layout_mismatch_disables_static_fetch(self, monkeypatch):
+        ftt.clear_flight_caches()
+        requested = []
+        broken_html = '<div class="J_link"><div class="airline-box"><img alt="国航"></div>CA1501</div>'
+
+        def fake_get(url, timeout):
+            requested.append(url)
+            return _FakeResponse(broken_html)
+
+        monkeypatch.setattr(ftt._http_session, "get", fake_get)
+        monkeypatch.setattr(ftt, "_fetch_direct_airline_rows_selenium", lambda url, f, t: ())
+        try:
+            assert ftt._fetch_direct_airline_rows("bjs", "sha") == ()
+            assert ftt._fetch_direct_airline_rows("bjs", "can") == ()
+            assert len(requested) == 1
+            assert ftt._static_layout_supported is False
+        finally:
+            ftt.clear_flight_caches()
+        assert ftt._static_layout_supported is True
+
+
+class _FakeDriver:
+    """只实现航线页面抓取用到的 WebDriver 接口"""
+
+    def __init__(self, cards):
+        self.cards = cards
+
+    def get(self, url):
+        pass
+
+    def find_elements(self, by, value):
+        return []
+
+    def execute_script(self, script):
+        if "readyState" in script:
+            return "complete"
+        return self.cards
+
+
+class TestSeleniumFallback:
+    """浏览器抓取路径"""
+
+    def test_empty_page_raises_and_is_not_cached(self, monkeypatch):
+        ftt.clear_flight_caches()
+        drivers = []
+
+        @contextmanager
+        def fake_acquire():
+            driver = _FakeDriver([])
+            drivers.append(driver)
+            yield driver
+
+        monkeypatch.setattr(ftt, "_static_layout_supported", False)
+        monkeypatch.setattr(ftt.driver_pool, "acquire", fake_acquire)
+        try:
+            with pytest.raises(ValueError):
+                ftt._fetch_direct_airline_rows("bjs", "sha")
+            # 空结果没有进入缓存，下次查询会重新抓取
+            assert ftt._get_direct_airline("BJS", "SHA") == []
+            assert len(drivers) == 2
+        finally:
+            ftt.clear_flight_caches()
+
+
+class TestBuildDirectAirlineRow:
+    """航班卡片文本到直飞航班数据的解析"""
+
+    def _card(self, price_line):
+        return "\n".join(SAMPLE_CARD_INNER_TEXT[:-1] + [price_line])
+
+    def test_range_price(self):
+        row = ftt._build_direct_airline_row(self._card("经济舱 520~1880"), "中国国际航空")
+        assert row == (
+            "CA1501", "波音737(中)", "中国国际航空", "首都机场 T3", "虹桥机场T2",
+            "08:00", "10:15", 520.0, 1880.0,
+        )
+
+    def test_single_price_used_for_both_cabins(self):
+        row = ftt._build_direct_airline_row(self._card("经济舱 680.5"), "中国国际航空")
+        assert row[-2:] == (680.5, 680.5)
+
+    def test_single_digit_hour(self):
+        lines = list(SAMPLE_CARD_INNER_TEXT)
+        lines[3] = "8:05"
+        row = ftt._build_direct_airline_row("\n".join(lines), "中国国际航空")
+        assert row[5] == "8:05"
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "",
+            "CA1501\n波音737",
+            "\n".join(SAMPLE_CARD_INNER_TEXT[:-1] + ["暂无报价"]),
+            "\n".join(SAMPLE_CARD_INNER_TEXT[:3] + ["待定"] + SAMPLE_CARD_INNER_TEXT[4:]),
+        ],
+    )
+    def test_malformed_card_returns_none(self, text):
+        assert ftt._build_direct_airline_row(text, "中国国际航空") is None
+
+
+class TestHmToMinutes:
+    """时刻到分钟数的换算"""
+
+    @pytest.mark.parametrize(
+        "hm, expected",
+        [("00:00", 0), ("08:05", 485), ("8:05", 485), ("12:30", 750), ("23:59", 1439)],
+    )
+    def test_conversion(self, hm, expected):
+        assert ftt._hm_to_minutes(hm) == expected
@@ -8,18 +8,58 @@ import customtkinter as ctk
 import threading
 import asyncio
 import json
+import logging
+import logging.handlers
+import atexit
 import os
 import sys
 import queue
+import time
+import concurrent.futures
 # ThreadPoolExecutor 已移至 segment_query.py
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Callable
+import httpx
 from openai import OpenAI
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.types import TextContent
+import tkinter as tk
 from tkinter import messagebox
 from tkcalendar import DateEntry
 
+# 导入 orjson（可选），可用时用于加速 JSON 解析与序列化
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger("gohome")
+
+
+def setup_logging(level: int = logging.INFO):
+    """
+    配置控制台日志
+
+    各线程只把日志记录放入队列，由 QueueListener 的单个线程负责实际输出，
+    后台线程突发大量日志时不会争抢 stdout/stderr 的锁。
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, console_handler)
+    listener.start()
+    # 退出时停止监听线程，确保队列中剩余的日志写出
+    atexit.register(listener.stop)
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    return listener
+
+
 # 导入中转枢纽模块
 from transfer_hubs import get_transfer_hub_prompt, hub_manager, RouteType
 
@@ -28,7 +68,8 @@ from segment_query import (
     SegmentQueryEngine,
     calculate_adjusted_train_date,
     detect_route_type,
-    get_route_type_description
+    get_route_type_description,
+    is_cacheable_tool_result
 )
 
 
@@ -74,150 +115,288 @@ FLIGHT_MCP_MODULE = "flight_ticket_mcp_server"
 # 配置文件路径
 CONFIG_FILE = os.path.join(PROJECT_ROOT, "config.json")
 
+# 模型列表缓存文件路径及有效期（秒）
+MODELS_CACHE_FILE = os.path.join(PROJECT_ROOT, "models_cache.json")
+MODELS_CACHE_TTL = 6 * 3600
+
+
+def json_loads(data):
+    """解析 JSON，orjson 可用时使用 orjson（其 JSONDecodeError 继承自 json.JSONDecodeError）"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """超过 limit 个字符时截断并加省略号，否则原样返回（不复制）"""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}..."
+
+
+def json_dumps_canonical(obj) -> bytes:
+    """按键排序序列化为 JSON 字节串，用作缓存键；orjson 可用时使用 orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+# UI 更新队列的处理间隔（毫秒）和单次最多处理条数
+UI_PUMP_INTERVAL_MS = 16
+UI_PUMP_BATCH_SIZE = 200
+
+# AI 请求失败时的提示文本
+AI_ERROR_CHECKLIST = "\n\n请检查：\n1. API Key 是否正确\n2. API Base URL 是否正确\n3. 网络连接是否正常\n4. MCP 服务是否已启动"
+AI_THINKING_MODEL_ERROR = (
+    "⚠️ AI 请求失败: 模型限制\n\n当前使用的是 thinking 类型模型，该类型模型在多轮工具调用时需要特殊处理。"
+    "\n\n解决方案：请在 API 设置中选择一个非 thinking 的普通模型"
+)
+
+# 共享后台线程池的线程数
+BACKGROUND_WORKERS = 8
+
+# OpenAI 客户端共用的 HTTP 连接池大小，不小于后台线程数与 AI 查询线程之和
+HTTP_POOL_SIZE = 16
+
+# 工具调用结果缓存时长（秒），按服务名区分：航班价格变化快，列车时刻相对稳定
+TOOL_RESULT_TTL = {"flight": 600, "train": 3600}
+TOOL_RESULT_CACHE_SIZE = 256
+
+# 日志中工具返回结果的最大显示长度
+LOG_RESULT_PREVIEW_CHARS = 200
+
+# 多轮工具调用时，早于最近几轮的工具结果截断后再发送，避免请求体随轮数平方增长
+TOOL_HISTORY_KEEP_ROUNDS = 2
+TOOL_HISTORY_MAX_CHARS = 512
+
+# 服务状态对应的侧边栏指示颜色
+SERVICE_STATE_COLORS = {"running": "green", "failed": "red", "stopped": "gray"}
+
+# 配置修改后延迟写盘的时间（秒）
+CONFIG_SAVE_DELAY = 0.3
+
+# 退出程序时等待每个 MCP 服务关闭的时间（秒）：stdio_client 关闭最长约 2.5 秒
+# （0.5 秒刷新 + 2 秒终止宽限期后强制结束），等待过短会遗留子进程和浏览器
+MCP_EXIT_STOP_TIMEOUT = 5
+
+# MCP 工具未声明参数时使用的空参数结构（各工具共享，只读）
+_EMPTY_SCHEMA = {"type": "object", "properties": {}}
+
+# 日志区最多保留的行数，超出时一次删除最早的若干行
+LOG_MAX_LINES = 500
+LOG_TRIM_LINES = 100
+
+
+class MCPHost:
+    """
+    MCP 事件循环宿主
+    在单个后台线程中运行共享事件循环，承载所有 MCP 会话
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """获取共享事件循环，首次访问时启动后台线程"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run, daemon=True, name="mcp-host")
+                self._thread.start()
+            return self._loop
+
+    def _run(self):
+        """后台线程主函数"""
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        except Exception as e:
+            logger.error("[MCPHost] 事件循环异常: %s", e)
+
+
+# 所有 MCP 会话共用的事件循环宿主
+mcp_host = MCPHost()
+
 
 class MCPClientWorker:
     """
-    MCP 客户端工作线程
-    在独立线程中运行异步事件循环，保持 MCP 连接的完整生命周期
+    MCP 客户端工作者
+    在共享事件循环中运行一个常驻任务，保持 MCP 连接的完整生命周期
     """
 
-    def __init__(self, name: str, command: List[str], cwd: str):
+    def __init__(self, name: str, command: List[str], cwd: str, host: Optional[MCPHost] = None,
+                 on_disconnect: Optional[Callable[[], None]] = None):
         self.name = name
         self.command = command
         self.cwd = cwd
+        # 启动参数在构造时确定，每次连接直接复用
+        self._server_params = StdioServerParameters(command=command[0], args=command[1:], cwd=cwd)
+        # 连接成功后非主动停止而断开时的回调
+        self._on_disconnect = on_disconnect
         self.tools: List[Dict] = []
+        # 暴露给 AI 的工具名前缀，如 "flight_"
+        self._prefix = f"{name}_"
+        # 带前缀工具名 -> MCP 原始工具名，连接时一次性构建
+        self._name_map: Dict[str, str] = {}
         self._running = False
         self._connected = False
-        self._thread: Optional[threading.Thread] = None
+        self._host = host or mcp_host
         self._loop: Optional[asyncio.AbstractEventLoop] = None
-        self._request_queue: queue.Queue = queue.Queue()
+        self._worker_future: Optional[concurrent.futures.Future] = None
+        self._session: Optional[ClientSession] = None
         self._stop_event = threading.Event()
         self._connect_event = threading.Event()
+        # 工作任务退出（包括 stdio_client 清理完毕）时置位
+        self._exited_event = threading.Event()
         self._connect_result = False
         self._connect_error = ""
 
     def start(self) -> bool:
-        """启动工作线程并连接到 MCP 服务"""
+        """在共享事件循环中启动工作任务并连接到 MCP 服务"""
         if self._running:
             return self._connected
 
+        self._launch()
+        return self._await_connect()
+
+    def _launch(self):
+        """只提交工作任务，不等待握手完成"""
         self._stop_event.clear()
         self._connect_event.clear()
-        self._thread = threading.Thread(target=self._run_worker, daemon=True)
-        self._thread.start()
+        self._exited_event.clear()
+        self._running = True
+        self._loop = self._host.loop
+        self._worker_future = asyncio.run_coroutine_threadsafe(self._run_worker(), self._loop)
 
-        # 等待连接完成（最多30秒）
-        self._connect_event.wait(timeout=30)
+    def _await_connect(self, timeout: float = 30) -> bool:
+        """等待连接完成（默认最多30秒）"""
+        self._connect_event.wait(timeout=timeout)
         return self._connect_result
 
-    def _run_worker(self):
-        """工作线程主函数"""
-        self._loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self._loop)
-        self._running = True
-
+    async def _run_worker(self):
+        """工作任务入口"""
         try:
-            self._loop.run_until_complete(self._async_worker())
+            await self._async_worker()
+        except asyncio.CancelledError:
+            # stop() 直接取消任务，async with 会在此前逐层退出
+            pass
         except Exception as e:
-            print(f"[{self.name}] 工作线程异常: {e}")
+            logger.error("[%s] 工作任务异常: %s", self.name, e)
         finally:
+            was_connected = self._connected
             self._running = False
             self._connected = False
-            self._loop.close()
+            self._exited_event.set()
+            if was_connected and not self._stop_event.is_set() and self._on_disconnect:
+                self._on_disconnect()
 
     async def _async_worker(self):
         """异步工作主循环"""
-        server_params = StdioServerParameters(
-            command=self.command[0],
-            args=self.command[1:] if len(self.command) > 1 else [],
-            cwd=self.cwd
-        )
-
         try:
-            async with stdio_client(server_params) as (read_stream, write_stream):
+            async with stdio_client(self._server_params) as (read_stream, write_stream):
                 async with ClientSession(read_stream, write_stream) as session:
                     # 初始化会话
                     await session.initialize()
 
                     # 获取工具列表
                     tools_result = await session.list_tools()
+                    prefix = self._prefix
                     self.tools = [
                         {
                             "type": "function",
                             "function": {
-                                "name": f"{self.name}_{tool.name}",
+                                "name": prefix + tool.name,
                                 "description": tool.description or "",
-                                "parameters": tool.inputSchema if hasattr(tool, 'inputSchema') else {"type": "object", "properties": {}}
+                                "parameters": getattr(tool, "inputSchema", None) or _EMPTY_SCHEMA
                             }
                         }
                         for tool in tools_result.tools
                     ]
+                    self._name_map = {
+                        prefix + tool.name: tool.name
+                        for tool in tools_result.tools
+                    }
 
+                    self._session = session
                     self._connected = True
                     self._connect_result = True
                     self._connect_event.set()
 
-                    # 主循环：处理工具调用请求
-                    while not self._stop_event.is_set():
-                        try:
-                            # 非阻塞检查请求队列
-                            try:
-                                request = self._request_queue.get_nowait()
-                            except queue.Empty:
-                                await asyncio.sleep(0.1)
-                                continue
-
-                            tool_name, arguments, result_queue = request
-
-                            try:
-                                # 移除服务名前缀
-                                actual_tool_name = tool_name.replace(f"{self.name}_", "")
-                                result = await session.call_tool(actual_tool_name, arguments)
-
-                                # 提取结果内容
-                                if result.content:
-                                    contents = []
-                                    for item in result.content:
-                                        if hasattr(item, 'text'):
-                                            contents.append(item.text)
-                                    result_str = "\n".join(contents) if contents else "工具执行成功，无返回内容"
-                                else:
-                                    result_str = "工具执行成功，无返回内容"
-
-                                result_queue.put(("success", result_str))
-                            except Exception as e:
-                                result_queue.put(("error", f"工具调用失败: {str(e)}"))
-
-                        except Exception as e:
-                            print(f"[{self.name}] 处理请求异常: {e}")
+                    # 会话保持打开，直到 stop() 取消本任务；工具调用由 _invoke 直接在本循环中执行
+                    await asyncio.Event().wait()
 
         except Exception as e:
             self._connect_error = str(e)
             self._connect_result = False
             self._connect_event.set()
-            print(f"[{self.name}] 连接失败: {e}")
+            logger.warning("[%s] 连接失败: %s", self.name, e)
+        finally:
+            self._session = None
 
-    def call_tool(self, tool_name: str, arguments: Dict, timeout: float = 60) -> str:
-        """调用 MCP 工具（线程安全）"""
-        if not self._connected:
+    async def _invoke(self, tool_name: str, arguments: Dict) -> str:
+        """在共享事件循环中执行一次工具调用"""
+        session = self._session
+        if session is None:
             return f"错误: {self.name} 服务未连接"
 
-        result_queue: queue.Queue = queue.Queue()
-        self._request_queue.put((tool_name, arguments, result_queue))
-
+        # 移除服务名前缀（不在工具列表中的名称按前缀截取）
+        actual_tool_name = self._name_map.get(tool_name)
+        if actual_tool_name is None:
+            actual_tool_name = tool_name[len(self._prefix):] if tool_name.startswith(self._prefix) else tool_name
+        result = await session.call_tool(actual_tool_name, arguments)
+
+        # 提取文本结果内容（图片、资源等其他类型的内容不参与拼接）
+        contents = [item.text for item in result.content or () if isinstance(item, TextContent)]
+        # mcp 2.x 的字段名为 is_error，1.x 为 isError
+        is_error = getattr(result, "is_error", None)
+        if is_error is None:
+            is_error = getattr(result, "isError", None)
+        if is_error:
+            # 工具报错以异常形式返回，调用方据此区分失败结果（不进入结果缓存）
+            raise RuntimeError("\n".join(contents) or "工具返回错误")
+        return "\n".join(contents) if contents else "工具执行成功，无返回内容"
+
+    def submit_tool(self, tool_name: str, arguments: Dict) -> Optional[concurrent.futures.Future]:
+        """提交一次工具调用并立即返回 Future（线程安全），服务未连接时返回 None"""
+        if not self._connected:
+            return None
+        try:
+            return asyncio.run_coroutine_threadsafe(self._invoke(tool_name, arguments), self._loop)
+        except RuntimeError:
+            # 事件循环已关闭
+            return None
+
+    @staticmethod
+    def collect_result(future: concurrent.futures.Future, tool_name: str, timeout: float) -> str:
+        """等待 submit_tool 返回的 Future 并转换为结果文本"""
         try:
-            _, result = result_queue.get(timeout=timeout)
-            return result
-        except queue.Empty:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
             return f"工具调用超时: {tool_name}"
+        except Exception as e:
+            return f"工具调用失败: {str(e)}"
+
+    def call_tool(self, tool_name: str, arguments: Dict, timeout: float = 60) -> str:
+        """调用 MCP 工具（线程安全）"""
+        future = self.submit_tool(tool_name, arguments)
+        if future is None:
+            return f"错误: {self.name} 服务未连接"
+        return self.collect_result(future, tool_name, timeout)
 
-    def stop(self):
-        """停止工作线程"""
+    def stop(self, timeout: float = 1):
+        """停止工作任务"""
         self._stop_event.set()
         self._connected = False
-        if self._thread and self._thread.is_alive():
-            self._thread.join(timeout=5)
+        if self._worker_future and not self._worker_future.done():
+            # 直接取消工作任务（内部经 call_soon_threadsafe 调用 task.cancel），
+            # async with stdio_client 随即逐层退出，通常远快于超时时间
+            self._worker_future.cancel()
+            self._exited_event.wait(timeout=timeout)
         self.tools = []
+        self._name_map = {}
         self._running = False
 
     @property
@@ -233,8 +412,121 @@ class MCPServiceManager:
     """MCP 服务管理器"""
 
     def __init__(self):
-        self.flight_client: Optional[MCPClientWorker] = None
-        self.train_client: Optional[MCPClientWorker] = None
+        # 按服务名（即工具名前缀）索引的工作线程，flight_client/train_client 为其别名
+        self._workers: Dict[str, MCPClientWorker] = {}
+        # 工具列表缓存：服务启停时版本号递增，缓存随之失效
+        self._tools_version = 0
+        self._tools_cache: Optional[List[Dict]] = None
+        self._tools_cache_key: Optional[Tuple[int, bool, bool]] = None
+        self._tool_name_to_worker: Dict[str, MCPClientWorker] = {}
+        # 按交通方式过滤后的工具列表，随 _tools_cache 一起失效
+        self._tools_by_transport: Dict[str, List[Dict]] = {}
+        # 服务状态监听器：callback(service, state)，state 为 running/failed/stopped
+        self._listeners: List[Callable[[str, str], None]] = []
+        # 工具调用结果缓存：(工具名, 参数 JSON 字节串) -> (写入时间, 结果)，仅缓存有效的非空结果
+        self._result_cache: Dict[Tuple[str, bytes], Tuple[float, str]] = {}
+        self._result_cache_lock = threading.Lock()
+
+    @property
+    def flight_client(self) -> Optional[MCPClientWorker]:
+        return self._workers.get("flight")
+
+    @flight_client.setter
+    def flight_client(self, worker: Optional[MCPClientWorker]):
+        self._set_worker("flight", worker)
+
+    @property
+    def train_client(self) -> Optional[MCPClientWorker]:
+        return self._workers.get("train")
+
+    @train_client.setter
+    def train_client(self, worker: Optional[MCPClientWorker]):
+        self._set_worker("train", worker)
+
+    def _set_worker(self, service: str, worker: Optional[MCPClientWorker]):
+        """登记或移除某个服务的工作线程"""
+        if worker is None:
+            self._workers.pop(service, None)
+        else:
+            self._workers[service] = worker
+
+    def add_listener(self, callback: Callable[[str, str], None]):
+        """注册服务状态变化监听器（回调可能在后台线程中执行）"""
+        self._listeners.append(callback)
+
+    def _notify(self, service: str, state: str):
+        """通知所有监听器服务状态变化"""
+        self._invalidate_tools()
+        for callback in self._listeners:
+            try:
+                callback(service, state)
+            except Exception as e:
+                logger.error("[MCP] 状态回调失败: %s", e)
+
+    def _invalidate_tools(self):
+        """服务状态变化后使工具缓存失效"""
+        self._tools_version += 1
+        self._tools_cache = None
+
+    def _create_flight_worker(self, log_callback=None) -> Optional[MCPClientWorker]:
+        """创建机票查询 MCP 工作线程（尚未启动）"""
+        # 根据运行环境选择启动方式
+        if IS_FROZEN:
+            # 打包环境：直接运行 FlightMCP.exe
+            if not os.path.exists(FLIGHT_MCP_EXE):
+                if log_callback:
+                    log_callback(f"[FlightMCP] 错误: 找不到 {FLIGHT_MCP_EXE}")
+                return None
+            command = [FLIGHT_MCP_EXE]
+            cwd = os.path.dirname(FLIGHT_MCP_EXE)
+        else:
+            # 开发环境：使用 python -m 模式
+            command = [PYTHON_EXE, "-m", FLIGHT_MCP_MODULE]
+            cwd = PROJECT_ROOT
+
+        return MCPClientWorker(
+            name="flight",
+            command=command,
+            cwd=cwd,
+            on_disconnect=lambda: self._notify("flight", "failed")
+        )
+
+    def _create_train_worker(self) -> MCPClientWorker:
+        """创建火车票查询 MCP 工作线程（尚未启动）"""
+        return MCPClientWorker(
+            name="train",
+            command=[NODE_EXE, TRAIN_MCP_SCRIPT],
+            cwd=os.path.dirname(TRAIN_MCP_SCRIPT),
+            on_disconnect=lambda: self._notify("train", "failed")
+        )
+
+    def _finish_flight_start(self, success: bool, log_callback=None) -> bool:
+        """根据握手结果记录机票服务状态"""
+        self._notify("flight", "running" if success else "failed")
+        if success:
+            if log_callback:
+                tool_count = len(self.flight_client.tools)
+                log_callback(f"[FlightMCP] 机票服务已连接，可用工具: {tool_count} 个")
+            return True
+        if log_callback:
+            error = self.flight_client.connect_error or "未知错误"
+            log_callback(f"[FlightMCP] 连接失败: {error}")
+        self.flight_client = None
+        return False
+
+    def _finish_train_start(self, success: bool, log_callback=None) -> bool:
+        """根据握手结果记录火车票服务状态"""
+        self._notify("train", "running" if success else "failed")
+        if success:
+            if log_callback:
+                tool_count = len(self.train_client.tools)
+                log_callback(f"[12306-MCP] 火车票服务已连接，可用工具: {tool_count} 个")
+            return True
+        if log_callback:
+            error = self.train_client.connect_error or "未知错误"
+            log_callback(f"[12306-MCP] 连接失败: {error}")
+        self.train_client = None
+        return False
 
     def start_flight_mcp(self, log_callback=None) -> bool:
         """启动机票查询 MCP 服务"""
@@ -244,41 +536,15 @@ class MCPServiceManager:
             return True
 
         try:
-            # 根据运行环境选择启动方式
-            if IS_FROZEN:
-                # 打包环境：直接运行 FlightMCP.exe
-                if not os.path.exists(FLIGHT_MCP_EXE):
-                    if log_callback:
-                        log_callback(f"[FlightMCP] 错误: 找不到 {FLIGHT_MCP_EXE}")
-                    return False
-                command = [FLIGHT_MCP_EXE]
-                cwd = os.path.dirname(FLIGHT_MCP_EXE)
-            else:
-                # 开发环境：使用 python -m 模式
-                command = [PYTHON_EXE, "-m", FLIGHT_MCP_MODULE]
-                cwd = PROJECT_ROOT
-
-            self.flight_client = MCPClientWorker(
-                name="flight",
-                command=command,
-                cwd=cwd
-            )
-
-            success = self.flight_client.start()
-            if success:
-                if log_callback:
-                    tool_count = len(self.flight_client.tools)
-                    log_callback(f"[FlightMCP] 机票服务已连接，可用工具: {tool_count} 个")
-                return True
-            else:
-                if log_callback:
-                    error = self.flight_client.connect_error or "未知错误"
-                    log_callback(f"[FlightMCP] 连接失败: {error}")
-                self.flight_client = None
+            self.flight_client = self._create_flight_worker(log_callback)
+            if self.flight_client is None:
+                self._notify("flight", "failed")
                 return False
+            return self._finish_flight_start(self.flight_client.start(), log_callback)
         except Exception as e:
             if log_callback:
                 log_callback(f"[FlightMCP] 启动失败: {str(e)}")
+            self._notify("flight", "failed")
             return False
 
     def start_train_mcp(self, log_callback=None) -> bool:
@@ -289,71 +555,160 @@ class MCPServiceManager:
             return True
 
         try:
-            self.train_client = MCPClientWorker(
-                name="train",
-                command=[NODE_EXE, TRAIN_MCP_SCRIPT],
-                cwd=os.path.dirname(TRAIN_MCP_SCRIPT)
-            )
-
-            success = self.train_client.start()
-            if success:
-                if log_callback:
-                    tool_count = len(self.train_client.tools)
-                    log_callback(f"[12306-MCP] 火车票服务已连接，可用工具: {tool_count} 个")
-                return True
-            else:
-                if log_callback:
-                    error = self.train_client.connect_error or "未知错误"
-                    log_callback(f"[12306-MCP] 连接失败: {error}")
-                self.train_client = None
-                return False
+            self.train_client = self._create_train_worker()
+            return self._finish_train_start(self.train_client.start(), log_callback)
         except Exception as e:
             if log_callback:
                 log_callback(f"[12306-MCP] 启动失败: {str(e)}")
+            self._notify("train", "failed")
             return False
 
-    def stop_flight_mcp(self, log_callback=None):
+    def stop_flight_mcp(self, log_callback=None, timeout: float = 1):
         """停止机票查询服务"""
         if self.flight_client:
-            self.flight_client.stop()
+            self.flight_client.stop(timeout)
             self.flight_client = None
             if log_callback:
                 log_callback("[FlightMCP] 服务已停止")
+        # 启动失败或从未启动的服务同样复位状态指示
+        self._notify("flight", "stopped")
 
-    def stop_train_mcp(self, log_callback=None):
+    def stop_train_mcp(self, log_callback=None, timeout: float = 1):
         """停止火车票查询服务"""
         if self.train_client:
-            self.train_client.stop()
+            self.train_client.stop(timeout)
             self.train_client = None
             if log_callback:
                 log_callback("[12306-MCP] 服务已停止")
+        # 启动失败或从未启动的服务同样复位状态指示
+        self._notify("train", "stopped")
 
-    def stop_all(self, log_callback=None):
-        """停止所有服务"""
-        self.stop_flight_mcp(log_callback)
-        self.stop_train_mcp(log_callback)
+    def stop_all(self, log_callback=None, timeout: float = 1):
+        """停止所有服务，timeout 为等待每个服务关闭的时间（秒）"""
+        self.stop_flight_mcp(log_callback, timeout)
+        self.stop_train_mcp(log_callback, timeout)
 
     def get_all_tools(self) -> List[Dict]:
         """获取所有可用的工具列表（OpenAI function calling 格式）"""
+        # 工作线程可能意外退出，缓存键同时包含两个服务的运行状态
+        key = (self._tools_version, self.flight_running, self.train_running)
+        if self._tools_cache is not None and self._tools_cache_key == key:
+            return self._tools_cache
+
         tools = []
-        if self.flight_client and self.flight_client.is_running:
-            tools.extend(self.flight_client.tools)
-        if self.train_client and self.train_client.is_running:
-            tools.extend(self.train_client.tools)
+        name_to_worker = {}
+        for worker in self._workers.values():
+            if worker.is_running:
+                tools.extend(worker.tools)
+                for tool in worker.tools:
+                    name_to_worker[tool["function"]["name"]] = worker
+
+        self._tools_cache = tools
+        self._tools_cache_key = key
+        self._tool_name_to_worker = name_to_worker
+        self._tools_by_transport = {}
         return tools
 
-    def call_tool(self, tool_name: str, arguments: Dict, timeout: float = 60) -> str:
-        """调用工具"""
+    def get_tools_for_transport(self, transport: str) -> List[Dict]:
+        """
+        获取指定交通方式可用的工具列表
+
+        结果与 get_all_tools 一同缓存，同一组工具在多次请求间复用同一个列表对象。
+        """
+        tools = self.get_all_tools()
+        if transport not in ("flight", "train"):
+            return tools
+
+        cached = self._tools_by_transport.get(transport)
+        if cached is None:
+            prefix = f"{transport}_"
+            cached = [t for t in tools if t["function"]["name"].startswith(prefix)]
+            self._tools_by_transport[transport] = cached
+        return cached
+
+    def _route(self, tool_name: str) -> Optional[MCPClientWorker]:
+        """按工具名查找所属工作线程，未命中时退回按前缀查找"""
+        self.get_all_tools()
+        worker = self._tool_name_to_worker.get(tool_name)
+        if worker is None:
+            worker = self._workers.get(tool_name.partition("_")[0])
+        return worker
+
+    def call_tool(self, tool_name: str, arguments: Dict, timeout: float = 60,
+                  use_cache: bool = False) -> str:
+        """调用工具，use_cache 为 True 时与 call_tools 共用结果缓存"""
         try:
-            if tool_name.startswith("flight_") and self.flight_client:
-                return self.flight_client.call_tool(tool_name, arguments, timeout)
-            elif tool_name.startswith("train_") and self.train_client:
-                return self.train_client.call_tool(tool_name, arguments, timeout)
-            else:
-                return f"未知工具: {tool_name}"
+            return self.call_tools([(tool_name, arguments)], timeout, use_cache)[0]
         except Exception as e:
             return f"工具调用失败: {str(e)}"
 
+    def call_tools(self, calls: List[Tuple[str, Dict]], timeout: float = 60,
+                   use_cache: bool = False) -> List[str]:
+        """
+        并发调用多个工具，按输入顺序返回结果
+
+        所有调用先提交到共享事件循环，再依次等待，整体耗时约等于最慢的一次调用。
+        use_cache 为 True 时读写结果缓存；默认不使用，预热等调用必须真正发起请求。
+        """
+        submitted = []
+        for tool_name, arguments in calls:
+            worker = self._route(tool_name)
+            if worker is None:
+                submitted.append((tool_name, None, None, f"未知工具: {tool_name}"))
+                continue
+            cache_key = self._result_cache_key(tool_name, arguments) if use_cache else None
+            cached = self._get_cached_result(cache_key, worker.name)
+            if cached is not None:
+                submitted.append((tool_name, None, None, cached))
+                continue
+            future = worker.submit_tool(tool_name, arguments)
+            submitted.append((tool_name, future, cache_key, f"错误: {worker.name} 服务未连接"))
+
+        # 所有调用共用同一个截止时间
+        deadline = time.monotonic() + timeout
+        results = []
+        for tool_name, future, cache_key, fallback in submitted:
+            if future is None:
+                results.append(fallback)
+                continue
+            remaining = max(0.0, deadline - time.monotonic())
+            result = MCPClientWorker.collect_result(future, tool_name, remaining)
+            # MCP 服务出错时只返回普通文本，需按内容判断，错误和空结果都不缓存，保证重试能真正发起请求
+            if cache_key is not None and future.done() and not future.cancelled() \
+                    and future.exception() is None and is_cacheable_tool_result(result):
+                self._put_cached_result(cache_key, result)
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _result_cache_key(tool_name: str, arguments: Dict) -> Optional[Tuple[str, bytes]]:
+        """生成结果缓存键，参数无法序列化时返回 None（不缓存）"""
+        try:
+            return tool_name, json_dumps_canonical(arguments)
+        except (TypeError, ValueError):
+            return None
+
+    def _get_cached_result(self, cache_key: Optional[Tuple[str, bytes]], service: str) -> Optional[str]:
+        """读取未过期的缓存结果"""
+        if cache_key is None:
+            return None
+        with self._result_cache_lock:
+            entry = self._result_cache.get(cache_key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] < TOOL_RESULT_TTL.get(service, 0):
+                return entry[1]
+            del self._result_cache[cache_key]
+        return None
+
+    def _put_cached_result(self, cache_key: Tuple[str, bytes], result: str):
+        """写入缓存，超过容量时淘汰最早写入的条目"""
+        with self._result_cache_lock:
+            self._result_cache.pop(cache_key, None)
+            if len(self._result_cache) >= TOOL_RESULT_CACHE_SIZE:
+                del self._result_cache[next(iter(self._result_cache))]
+            self._result_cache[cache_key] = (time.monotonic(), result)
+
     @property
     def flight_running(self) -> bool:
         return self.flight_client is not None and self.flight_client.is_running
@@ -369,6 +724,12 @@ class ConfigManager:
     def __init__(self, config_file: str):
         self.config_file = config_file
         self.config = self.load_config()
+        self._lock = threading.Lock()
+        # 串行化写盘：从取快照到 os.replace 全程持有，避免旧快照覆盖新快照或共用临时文件时交错写入
+        self._write_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        # 内存中的配置与文件不一致时为 True；配置文件不存在时首次保存需写入默认值
+        self._dirty = not os.path.exists(config_file)
 
     def load_config(self) -> dict:
         """加载配置"""
@@ -382,8 +743,8 @@ class ConfigManager:
 
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    saved_config = json.load(f)
+                with open(self.config_file, 'rb') as f:
+                    saved_config = json_loads(f.read())
                     default_config.update(saved_config)
             except Exception:
                 pass
@@ -391,30 +752,246 @@ class ConfigManager:
         return default_config
 
     def save_config(self):
-        """保存配置"""
+        """立即保存配置（取消尚未执行的延迟保存），配置未修改时不写盘"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        self._save_if_dirty()
+
+    def _save_if_dirty(self):
+        """配置有修改时取快照并写盘（持有写锁，写盘顺序与快照顺序一致）"""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                snapshot = dict(self.config)
+            self._write_config(snapshot)
+
+    def _write_config(self, config: dict):
+        """先写临时文件再原子替换，避免写入中断留下损坏的配置文件"""
+        tmp_file = self.config_file + ".tmp"
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+            if ORJSON_AVAILABLE:
+                data = orjson.dumps(config, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            else:
+                data = json.dumps(config, indent=2, ensure_ascii=False).encode('utf-8')
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, self.config_file)
         except Exception as e:
-            print(f"保存配置失败: {e}")
+            logger.error("保存配置失败: %s", e)
+
+    def _schedule_save(self):
+        """延迟保存：短时间内的多次修改合并为一次写盘"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(CONFIG_SAVE_DELAY, self._do_scheduled_save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _do_scheduled_save(self):
+        """延迟保存定时器回调"""
+        with self._lock:
+            self._save_timer = None
+        self._save_if_dirty()
 
     def get(self, key: str, default=None):
         return self.config.get(key, default)
 
     def set(self, key: str, value):
-        self.config[key] = value
+        with self._lock:
+            if key in self.config and self.config[key] == value:
+                return
+            self.config[key] = value
+            self._dirty = True
+        self._schedule_save()
+
+
+class ModelListCache:
+    """模型列表磁盘缓存，按 API Base URL 分别保存"""
+
+    def __init__(self, cache_file: str, ttl: float):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        """加载缓存文件，文件不存在或损坏时返回空缓存"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'rb') as f:
+                    entries = json_loads(f.read())
+                if isinstance(entries, dict):
+                    return entries
+            except Exception:
+                pass
+        return {}
+
+    def get(self, base_url: str) -> Optional[Tuple[List[str], bool]]:
+        """
+        获取缓存的模型列表
+
+        Returns:
+            (已排序的模型ID列表, 是否仍在有效期内)，无缓存时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(base_url)
+        if not entry or not entry.get("ids"):
+            return None
+        fresh = time.time() - entry.get("ts", 0) < self.ttl
+        return entry["ids"], fresh
+
+    def set(self, base_url: str, model_ids: List[str]):
+        """保存模型列表并写盘（先写临时文件再原子替换）"""
+        with self._lock:
+            self._entries[base_url] = {"ts": time.time(), "ids": model_ids}
+            data = json.dumps(self._entries, ensure_ascii=False).encode('utf-8')
+        tmp_file = self.cache_file + ".tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logger.warning("保存模型列表缓存失败: %s", e)
 
 
 class GoHomeApp(ctk.CTk):
     """Go-home 主应用程序"""
 
+    # 系统提示词中随用户偏好变化的片段
+    _PRIORITY_MAP = {
+        "cheap": "用户更看重价格，请优先推荐价格最低的方案，即使需要多花一些时间。",
+        "fast": "用户更看重时间，请优先推荐最快到达的方案，价格可以适当高一些。",
+        "balanced": "用户希望在价格和时间之间取得平衡，请综合考虑推荐性价比最高的方案。"
+    }
+
+    _TRANSPORT_MAP = {
+        "flight": "用户只考虑飞机出行，请只查询和推荐航班信息。",
+        "train": "用户只考虑火车出行，请只查询和推荐火车票信息（高铁、动车、普通列车等）。",
+        "all": "用户对交通方式没有限制，请同时查询飞机和火车，比较后给出最佳推荐。"
+    }
+
+    _DURATION_MAP = {
+        "same_day": "用户希望当天到达目的地，请只推荐出发当天能够到达的方案，不要推荐需要过夜或次日到达的行程。",
+        "normal": "用户可以接受隔天到达（24小时内），但不希望行程过长。",
+        "long": "用户可以接受长途行程，即使需要超过24小时也可以接受，包括中转、换乘等复杂方案。"
+    }
+
+    # 输出要求第4点，按住宿费用开关取值
+    _OUTPUT_PRICE_INFO = {
+        True: "4. 列出每个方案的关键信息：出发时间、到达时间、历时、价格、真实成本（含住宿费）",
+        False: "4. 列出每个方案的关键信息：出发时间、到达时间、历时、价格",
+    }
+
+    _ACCOMMODATION_PROMPT_TEMPLATE = """【重要：住宿费用计算规则】
+为了给用户更真实的成本预估，需要在以下情况额外加 ¥200 住宿费：
+
+判断条件（满足任一即可）：
+1. 中转等待时间 ≥ {threshold_hours} 小时 且 等待时段覆盖夜间（22:00-06:00）
+2. 中转等待时间 ≥ 12 小时（无论白天黑夜，超长等待必须休息）
+
+不需要加住宿费的情况：
+- 直达航班/火车（无论多长时间，都在交通工具上休息）
+- 中转等待时间 < {threshold_hours} 小时 且 不跨夜间
+- 乘坐卧铺火车过夜（车票已包含住宿功能）
+
+在推荐时，请计算"真实成本" = 票价 + 住宿费（如需要）。
+"""
+
+    # 系统提示词模板，由 build_system_prompt 通过 format_map 填充
+    _SYSTEM_PROMPT_TEMPLATE = """你是 Go-home 智能出行助手，专门帮助用户查询机票和火车票信息，规划回家的最优路线。
+
+【当前时间】
+今天是 {today_str}
+
+【重要：服务覆盖范围】
+1. **机票服务（FlightTicketMCP）**：
+   - ✅ 支持国际航班和国内航班
+   - ✅ 覆盖全球主要城市（北京、上海、曼谷、新加坡、东京、纽约等）
+   - ✅ 可查询任意日期的航班
+
+2. **火车票服务（12306-MCP）**：
+   - ✅ 仅支持中国国内火车票
+   - ❌ 不支持国际城市（如曼谷、新加坡等无中国火车站）
+   - ⚠️ 仅能查询15天内的车票
+
+【国际出行规划策略】
+当出发地或目的地包含国际城市时：
+- 国际城市 → 国内城市：先查机票到达国内枢纽（如北京、上海、广州）
+- 国内枢纽 → 最终目的地：可查机票或火车票
+- 例如：曼谷→长治 = 曼谷✈️北京 + 北京🚄长治
+
+【用户偏好】
+{priority_text}
+{transport_text}
+{duration_text}
+
+【12306火车票查询限制】
+12306系统只能查询15天内（含当天）的火车票，即 {today_str} 至 {max_train_date_str}。
+- 如果用户查询的日期超出此范围，请使用 {max_train_date_str} 作为查询日期
+- 但在输出结果时，必须明确提示用户：
+  "⚠️ 注意：12306仅支持查询15天内的车票。您查询的日期超出范围，以下展示的是 {max_train_date_str} 的班次信息作为参考。
+  铁路班次时刻表通常固定不变，票价在非节假日期间也基本稳定，实际购票时请以12306官方为准。"
+- 机票查询不受此限制，可以查询更远日期
+
+【重要：工具调用参数格式】
+调用工具时必须传递正确的参数，以下是具体示例：
+
+1. 查询火车票城市代码（必须先调用）：
+   工具: train_get-station-code-of-citys
+   参数: {{"citys": "北京|上海"}}  // citys 参数必填，多个城市用 | 分隔
+
+2. 查询火车票：
+   工具: train_get-tickets
+   参数: {{"date": "2025-01-15", "fromStation": "BJP", "toStation": "SHH"}}
+
+3. 查询机票航线：
+   工具: flight_searchFlightRoutes
+   参数: {{"departure_city": "北京", "destination_city": "上海", "departure_date": "2025-01-15"}}
+
+4. 查询中转机票（需指定中转城市）：
+   工具: flight_getTransferFlightsByThreePlace
+   参数: {{"from_place": "北京", "transfer_place": "郑州", "to_place": "上海"}}
+
+5. 查询火车票中转方案：
+   工具: train_get-interline-tickets
+   参数: {{"date": "2025-01-15", "fromStation": "BJP", "toStation": "CZH", "transferStation": "ZZF"}}
+
+【工具使用流程】
+- 火车票查询：先用 train_get-station-code-of-citys 获取站点代码，再用 train_get-tickets 查询
+- 机票查询：直接用 flight_searchFlightRoutes，城市名使用中文
+- 中转查询：需要指定中转城市/车站
+{transfer_hub_prompt}
+{accommodation_prompt}
+【输出要求】
+1. 根据查询结果，整理出清晰的票务信息
+2. 按照用户偏好排序推荐方案
+3. 给出具体的推荐理由
+{output_price_info}
+5. 使用友好的中文回复，格式清晰易读
+6. 如果有多个好的选择，最多推荐3个最佳方案"""
+
     def __init__(self):
         super().__init__()
 
         # 初始化管理器
         self.config_manager = ConfigManager(CONFIG_FILE)
+        self.model_cache = ModelListCache(MODELS_CACHE_FILE, MODELS_CACHE_TTL)
         self.mcp_manager = MCPServiceManager()
         self.openai_client: Optional[OpenAI] = None
+        # OpenAI 客户端按 (api_key, base_url) 缓存；所有客户端共用同一个 httpx 连接池，
+        # 更换 API Key 后访问同一服务地址仍可复用已建立的连接
+        self._http_client = httpx.Client(limits=httpx.Limits(
+            max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE
+        ))
+        self._openai_client_cache: Dict[Tuple[str, str], OpenAI] = {}
+        self._openai_client_lock = threading.Lock()
+        # 系统提示词缓存：(输入参数, 提示词)
+        self._system_prompt_cache: Optional[Tuple[tuple, str]] = None
 
         # 设置主题
         ctk.set_appearance_mode(self.config_manager.get("theme", "dark"))
@@ -439,12 +1016,124 @@ class GoHomeApp(ctk.CTk):
             "query_info": {},  # 查询信息（出发地、目的地、日期等）
         }
 
+        # 工作线程的 UI 更新统一投递到该队列，有待处理项时才调度主线程批量处理
+        self._ui_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._ui_drain_scheduled = False
+        # 可合并的 UI 更新：队列中连续的同类项拼接参数后一次执行
+        self._mergeable_ui_funcs = (self.append_result, self._insert_log_line)
+        # 日志时间戳缓存 (整秒, 格式化字符串)，同一秒内的日志复用
+        self._log_ts_cache: Tuple[int, str] = (-1, "")
+
+        # 短时后台任务（启动服务、获取模型列表等）共用的线程池
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=BACKGROUND_WORKERS, thread_name_prefix="gh"
+        )
+
+        # 服务状态变化时更新侧边栏状态指示
+        self.mcp_manager.add_listener(self._on_service_state_changed)
+
+        # 模型列表后台获取任务，用于合并重复点击
+        self._models_future: Optional[concurrent.futures.Future] = None
+
         # 创建 UI
         self.create_ui()
+        self.after(0, self._preload_models)
 
         # 绑定关闭事件
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+    def post_ui(self, func, *args):
+        """从任意线程投递一次 UI 更新（参数立即求值，避免 lambda 延迟绑定）"""
+        self._ui_queue.put((func, args))
+        # 先入队再检查标志：处理函数会先清标志再取队列，不会漏掉更新
+        if not self._ui_drain_scheduled:
+            self._schedule_ui_drain()
+
+    def _schedule_ui_drain(self):
+        """调度一次批量处理，间隔内的多次投递合并处理"""
+        self._ui_drain_scheduled = True
+        try:
+            self.after(UI_PUMP_INTERVAL_MS, self._drain_ui_queue)
+        except (RuntimeError, tk.TclError):
+            # 窗口已销毁
+            pass
+
+    def _drain_ui_queue(self):
+        """主线程批量执行排队的 UI 更新"""
+        self._ui_drain_scheduled = False
+        pending_func = None
+        pending_parts: List[str] = []
+        for _ in range(UI_PUMP_BATCH_SIZE):
+            try:
+                func, args = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            # 连续的结果追加 / 日志写入合并为一次插入，减少文本控件的重排次数
+            if func in self._mergeable_ui_funcs:
+                if pending_parts and func != pending_func:
+                    self._apply_ui_update(pending_func, ("".join(pending_parts),))
+                    pending_parts = []
+                pending_func = func
+                pending_parts.append(args[0])
+                continue
+            if pending_parts:
+                self._apply_ui_update(pending_func, ("".join(pending_parts),))
+                pending_parts = []
+            self._apply_ui_update(func, args)
+        if pending_parts:
+            self._apply_ui_update(pending_func, ("".join(pending_parts),))
+        # 超出单批上限时继续调度剩余项
+        if not self._ui_queue.empty() and not self._ui_drain_scheduled:
+            self._schedule_ui_drain()
+
+    def _apply_ui_updates(self, updates: List[Tuple]):
+        """依次执行一组 (函数, 参数) UI 更新"""
+        for func, args in updates:
+            self._apply_ui_update(func, args)
+
+    @staticmethod
+    def _apply_ui_update(func, args):
+        """执行单个 UI 更新，异常不影响后续更新"""
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error("[UI] 更新失败: %s", e)
+
+    def run_in_background(self, fn, *args) -> concurrent.futures.Future:
+        """把短时任务提交到共享线程池，未捕获的异常输出到控制台"""
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._report_background_error)
+        return future
+
+    @staticmethod
+    def _report_background_error(future: concurrent.futures.Future):
+        """后台任务完成回调：输出未捕获的异常"""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("[后台任务] 异常: %s", future.exception())
+
+    def _on_service_state_changed(self, service: str, state: str):
+        """MCP 服务状态监听器：更新对应的状态指示颜色"""
+        label = self.flight_status if service == "flight" else self.train_status
+        color = SERVICE_STATE_COLORS.get(state, "gray")
+        self.post_ui(lambda: label.configure(text_color=color))
+
+    def get_openai_client(self, api_key: str, base_url: str) -> OpenAI:
+        """获取（必要时创建）与当前 API 配置对应的 OpenAI 客户端"""
+        key = (api_key, base_url)
+        with self._openai_client_lock:
+            client = self._openai_client_cache.get(key)
+            if client is None:
+                client = OpenAI(api_key=api_key, base_url=base_url, http_client=self._http_client)
+                self._openai_client_cache[key] = client
+            self.openai_client = client
+            return client
+
+    def clear_openai_clients(self):
+        """API 配置变更后丢弃已缓存的客户端"""
+        with self._openai_client_lock:
+            self._openai_client_cache.clear()
+            self.openai_client = None
+
     def create_ui(self):
         """创建用户界面"""
         # 配置网格
@@ -846,9 +1535,10 @@ class GoHomeApp(ctk.CTk):
         self.main_title.pack(side="left")
 
         # 时间显示
+        self.time_var = ctk.StringVar(value="")
         self.time_label = ctk.CTkLabel(
             self.title_frame,
-            text="",
+            textvariable=self.time_var,
             font=ctk.CTkFont(size=14)
         )
         self.time_label.pack(side="right")
@@ -1046,6 +1736,11 @@ class GoHomeApp(ctk.CTk):
         self.progress_bar.set(0)
         self.progress_label.configure(text="")
 
+    def _finish_query_ui(self):
+        """查询结束后隐藏进度条并恢复查询按钮"""
+        self.hide_progress()
+        self.query_btn.configure(state="normal", text="🔍 开始查询")
+
     def create_result_area(self):
         """创建结果展示区域"""
         self.result_frame = ctk.CTkFrame(self.main_frame)
@@ -1096,9 +1791,25 @@ class GoHomeApp(ctk.CTk):
         self.log_textbox.grid(row=1, column=0, padx=15, pady=(0, 10), sticky="nsew")
 
     def log_message(self, message: str):
-        """添加日志消息"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_textbox.insert("end", f"[{timestamp}] {message}\n")
+        """添加日志消息（线程安全：所有调用都经 UI 队列在主线程按调用顺序写入）"""
+        now = time.time()
+        sec = int(now)
+        cached_sec, timestamp = self._log_ts_cache
+        if sec != cached_sec:
+            timestamp = time.strftime("%H:%M:%S", time.localtime(now))
+            self._log_ts_cache = (sec, timestamp)
+        line = f"[{timestamp}] {message}\n"
+        # 主线程调用也走队列，避免插到其他线程尚未写入的日志之前
+        self.post_ui(self._insert_log_line, line)
+
+    def _insert_log_line(self, line: str):
+        """在主线程写入日志（可能是 UI 队列合并后的多行）"""
+        self.log_textbox.insert("end", line)
+        # 超过行数上限时从顶部删除旧日志，避免长时间运行后插入越来越慢
+        line_count = int(self.log_textbox.index("end-1c").split(".")[0])
+        if line_count > LOG_MAX_LINES:
+            trim_to = line_count - LOG_MAX_LINES + LOG_TRIM_LINES
+            self.log_textbox.delete("1.0", f"{trim_to}.0")
         self.log_textbox.see("end")
 
     def show_result(self, content: str):
@@ -1314,144 +2025,54 @@ class GoHomeApp(ctk.CTk):
 
     def update_time(self):
         """更新时间显示"""
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.time_label.configure(text=current_time)
+        # 窗口最小化或隐藏时不刷新，恢复后下一次调度自动更新
+        if self.state() not in ("iconic", "withdrawn"):
+            self.time_var.set(time.strftime("%Y-%m-%d %H:%M:%S"))
         self.after(1000, self.update_time)
 
-    def build_system_prompt(self) -> str:
-        """根据用户选项构建系统提示词"""
-        priority = self.priority_var.get()
-        transport = self.transport_var.get()
-        duration = self.duration_var.get()
-
-        priority_text = {
-            "cheap": "用户更看重价格，请优先推荐价格最低的方案，即使需要多花一些时间。",
-            "fast": "用户更看重时间，请优先推荐最快到达的方案，价格可以适当高一些。",
-            "balanced": "用户希望在价格和时间之间取得平衡，请综合考虑推荐性价比最高的方案。"
-        }[priority]
-
-        transport_text = {
-            "flight": "用户只考虑飞机出行，请只查询和推荐航班信息。",
-            "train": "用户只考虑火车出行，请只查询和推荐火车票信息（高铁、动车、普通列车等）。",
-            "all": "用户对交通方式没有限制，请同时查询飞机和火车，比较后给出最佳推荐。"
-        }[transport]
-
-        duration_text = {
-            "same_day": "用户希望当天到达目的地，请只推荐出发当天能够到达的方案，不要推荐需要过夜或次日到达的行程。",
-            "normal": "用户可以接受隔天到达（24小时内），但不希望行程过长。",
-            "long": "用户可以接受长途行程，即使需要超过24小时也可以接受，包括中转、换乘等复杂方案。"
-        }[duration]
+    def build_system_prompt(self, options: Dict[str, Any]) -> str:
+        """根据用户选项（_snapshot_query_options 的结果）构建系统提示词"""
+        priority = options["priority"]
+        transport = options["transport"]
+        duration = options["duration"]
 
         # 获取当前日期用于12306查询限制计算
         from datetime import datetime, timedelta
         today = datetime.now()
         max_train_date = today + timedelta(days=14)  # 12306只能查15天内（含当天）
         today_str = today.strftime("%Y-%m-%d")
-        max_train_date_str = max_train_date.strftime("%Y-%m-%d")
 
         # 获取住宿费用设置
         accommodation_enabled = self.config_manager.get("accommodation_enabled", True)
         threshold_hours = self.config_manager.get("accommodation_threshold", 6)
 
-        if accommodation_enabled:
-            accommodation_prompt = f"""【重要：住宿费用计算规则】
-为了给用户更真实的成本预估，需要在以下情况额外加 ¥200 住宿费：
-
-判断条件（满足任一即可）：
-1. 中转等待时间 ≥ {threshold_hours} 小时 且 等待时段覆盖夜间（22:00-06:00）
-2. 中转等待时间 ≥ 12 小时（无论白天黑夜，超长等待必须休息）
-
-不需要加住宿费的情况：
-- 直达航班/火车（无论多长时间，都在交通工具上休息）
-- 中转等待时间 < {threshold_hours} 小时 且 不跨夜间
-- 乘坐卧铺火车过夜（车票已包含住宿功能）
-
-在推荐时，请计算"真实成本" = 票价 + 住宿费（如需要）。
-"""
-        else:
-            accommodation_prompt = ""
-
         # 获取中转枢纽模式的提示词补充
         transfer_hub_prompt = get_transfer_hub_prompt(transport, self.transfer_hub_mode)
 
-        # 输出要求第4点根据住宿费用开关状态动态变化
+        # 所有可变输入都未变化时直接复用上次构建的提示词
+        cache_key = (priority, transport, duration, today_str,
+                     accommodation_enabled, threshold_hours, transfer_hub_prompt)
+        if self._system_prompt_cache and self._system_prompt_cache[0] == cache_key:
+            return self._system_prompt_cache[1]
+
         if accommodation_enabled:
-            output_price_info = "4. 列出每个方案的关键信息：出发时间、到达时间、历时、价格、真实成本（含住宿费）"
+            accommodation_prompt = self._ACCOMMODATION_PROMPT_TEMPLATE.format(threshold_hours=threshold_hours)
         else:
-            output_price_info = "4. 列出每个方案的关键信息：出发时间、到达时间、历时、价格"
-
-        base_prompt = f"""你是 Go-home 智能出行助手，专门帮助用户查询机票和火车票信息，规划回家的最优路线。
-
-【当前时间】
-今天是 {today_str}
-
-【重要：服务覆盖范围】
-1. **机票服务（FlightTicketMCP）**：
-   - ✅ 支持国际航班和国内航班
-   - ✅ 覆盖全球主要城市（北京、上海、曼谷、新加坡、东京、纽约等）
-   - ✅ 可查询任意日期的航班
-
-2. **火车票服务（12306-MCP）**：
-   - ✅ 仅支持中国国内火车票
-   - ❌ 不支持国际城市（如曼谷、新加坡等无中国火车站）
-   - ⚠️ 仅能查询15天内的车票
-
-【国际出行规划策略】
-当出发地或目的地包含国际城市时：
-- 国际城市 → 国内城市：先查机票到达国内枢纽（如北京、上海、广州）
-- 国内枢纽 → 最终目的地：可查机票或火车票
-- 例如：曼谷→长治 = 曼谷✈️北京 + 北京🚄长治
-
-【用户偏好】
-{priority_text}
-{transport_text}
-{duration_text}
-
-【12306火车票查询限制】
-12306系统只能查询15天内（含当天）的火车票，即 {today_str} 至 {max_train_date_str}。
-- 如果用户查询的日期超出此范围，请使用 {max_train_date_str} 作为查询日期
-- 但在输出结果时，必须明确提示用户：
-  "⚠️ 注意：12306仅支持查询15天内的车票。您查询的日期超出范围，以下展示的是 {max_train_date_str} 的班次信息作为参考。
-  铁路班次时刻表通常固定不变，票价在非节假日期间也基本稳定，实际购票时请以12306官方为准。"
-- 机票查询不受此限制，可以查询更远日期
-
-【重要：工具调用参数格式】
-调用工具时必须传递正确的参数，以下是具体示例：
-
-1. 查询火车票城市代码（必须先调用）：
-   工具: train_get-station-code-of-citys
-   参数: {{"citys": "北京|上海"}}  // citys 参数必填，多个城市用 | 分隔
-
-2. 查询火车票：
-   工具: train_get-tickets
-   参数: {{"date": "2025-01-15", "fromStation": "BJP", "toStation": "SHH"}}
-
-3. 查询机票航线：
-   工具: flight_searchFlightRoutes
-   参数: {{"departure_city": "北京", "destination_city": "上海", "departure_date": "2025-01-15"}}
-
-4. 查询中转机票（需指定中转城市）：
-   工具: flight_getTransferFlightsByThreePlace
-   参数: {{"from_place": "北京", "transfer_place": "郑州", "to_place": "上海"}}
-
-5. 查询火车票中转方案：
-   工具: train_get-interline-tickets
-   参数: {{"date": "2025-01-15", "fromStation": "BJP", "toStation": "CZH", "transferStation": "ZZF"}}
-
-【工具使用流程】
-- 火车票查询：先用 train_get-station-code-of-citys 获取站点代码，再用 train_get-tickets 查询
-- 机票查询：直接用 flight_searchFlightRoutes，城市名使用中文
-- 中转查询：需要指定中转城市/车站
-{transfer_hub_prompt}
-{accommodation_prompt}
-【输出要求】
-1. 根据查询结果，整理出清晰的票务信息
-2. 按照用户偏好排序推荐方案
-3. 给出具体的推荐理由
-{output_price_info}
-5. 使用友好的中文回复，格式清晰易读
-6. 如果有多个好的选择，最多推荐3个最佳方案"""
+            accommodation_prompt = ""
 
+        base_prompt = self._SYSTEM_PROMPT_TEMPLATE.format_map({
+            "today_str": today_str,
+            "max_train_date_str": max_train_date.strftime("%Y-%m-%d"),
+            "priority_text": self._PRIORITY_MAP[priority],
+            "transport_text": self._TRANSPORT_MAP[transport],
+            "duration_text": self._DURATION_MAP[duration],
+            "transfer_hub_prompt": transfer_hub_prompt,
+            "accommodation_prompt": accommodation_prompt,
+            # 输出要求第4点根据住宿费用开关状态动态变化
+            "output_price_info": self._OUTPUT_PRICE_INFO[accommodation_enabled],
+        })
+
+        self._system_prompt_cache = (cache_key, base_prompt)
         return base_prompt
 
     def start_query(self):
@@ -1499,20 +2120,36 @@ class GoHomeApp(ctk.CTk):
         self.show_result(f"🔍 正在查询 {from_city} → {to_city} ({date}) 的出行方案...\n\n请稍候，AI 正在为您分析最优路线...")
         self.log_message(f"[查询] {from_city} → {to_city}, 日期: {date}")
 
+        # 在主线程读取界面选项，后台线程只使用这份快照（Tk 控件不是线程安全的）
+        options = self._snapshot_query_options(api_key, transport)
+
         # 异步调用 AI
         if self.transfer_hub_mode:
             # 中转枢纽模式：程序主动遍历枢纽查询
             thread = threading.Thread(
                 target=self.call_ai_with_hub_query,
-                args=(from_city, to_city, date),
+                args=(from_city, to_city, date, options),
                 daemon=True
             )
         else:
             # 标准模式：让 AI 自己决定查询
-            thread = threading.Thread(target=self.call_ai_api, args=(user_message,), daemon=True)
+            thread = threading.Thread(target=self.call_ai_api, args=(user_message, options), daemon=True)
         thread.start()
 
-    def call_ai_with_hub_query(self, from_city: str, to_city: str, date: str):
+    def _snapshot_query_options(self, api_key: str, transport: str) -> Dict[str, Any]:
+        """读取查询所需的界面选项（须在主线程调用）"""
+        return {
+            "api_key": api_key,
+            "base_url": self.api_url_entry.get(),
+            "model": self.model_combobox.get(),
+            "transport": transport,
+            "priority": self.priority_var.get(),
+            "duration": self.duration_var.get(),
+            "hub_strategy": self.hub_strategy_var.get(),
+            "use_international_hubs": self.international_hub_var.get() == "on",
+        }
+
+    def call_ai_with_hub_query(self, from_city: str, to_city: str, date: str, options: Dict[str, Any]):
         """
         中转枢纽模式：使用分段查询引擎进行多线程并行查询
 
@@ -1523,11 +2160,11 @@ class GoHomeApp(ctk.CTk):
         - 最后让 AI 分析推荐最优方案
         - 智能路线检测：自动识别国内/国际路线，选择合适的中转枢纽
         """
-        transport = self.transport_var.get()
+        transport = options["transport"]
 
         # 【修改】从查询策略中提取枢纽数量（如"推荐(30个)" → 30）
         import re
-        strategy_value = self.hub_strategy_var.get()
+        strategy_value = options["hub_strategy"]
         match = re.search(r'\((\d+)个\)', strategy_value)
         if match:
             hub_count = int(match.group(1))
@@ -1535,7 +2172,7 @@ class GoHomeApp(ctk.CTk):
             hub_count = 15  # 默认值
 
         # 获取国际节点查询开关状态
-        use_international_hubs = self.international_hub_var.get() == "on"
+        use_international_hubs = options["use_international_hubs"]
 
         # 使用智能枢纽选择（根据路线类型自动选择合适的枢纽）
         hub_cities, route_type, tip_message = hub_manager.get_hubs_for_route(
@@ -1552,20 +2189,17 @@ class GoHomeApp(ctk.CTk):
             # 国际路线：显示特殊提示
             hub_preview = ", ".join(hub_cities[:5]) + ("..." if len(hub_cities) > 5 else "")
             route_tip = f"🌍 检测到{route_type_name}，已自动启用国际中转枢纽 {len(hub_cities)} 个（{hub_preview}）"
-            self.after(0, lambda msg=route_tip: self.log_message(f"[智能枢纽] {msg}"))
-            self.after(0, lambda msg=route_tip: self.append_result(f"\n\n{msg}"))
+            self.log_message(f"[智能枢纽] {route_tip}")
+            self.post_ui(self.append_result, f"\n\n{route_tip}")
         else:
             # 国内路线：显示普通提示
-            self.after(0, lambda: self.log_message(f"[分段查询] 准备查询，中转城市({len(hub_cities)}个): {', '.join(hub_cities)}"))
+            self.log_message(f"[分段查询] 准备查询，中转城市({len(hub_cities)}个): {', '.join(hub_cities)}")
 
-        self.after(0, lambda: self.append_result(f"\n\n🚀 启动分段查询引擎...\n📍 路线类型: {route_type_name}\n🏙️ 中转枢纽({len(hub_cities)}个): {', '.join(hub_cities)}"))
+        self.post_ui(self.append_result, f"\n\n🚀 启动分段查询引擎...\n📍 路线类型: {route_type_name}\n🏙️ 中转枢纽({len(hub_cities)}个): {', '.join(hub_cities)}")
 
         # 创建分段查询引擎
-        def log_callback(msg):
-            self.after(0, lambda m=msg: self.log_message(m))
-
         def progress_callback(current, total, desc):
-            self.after(0, lambda c=current, t=total, d=desc: self.show_progress(c, t, f"🔍 {d}"))
+            self.post_ui(self.show_progress, current, total, f"🔍 {desc}")
 
         # 获取住宿配置
         accommodation_enabled = self.config_manager.get("accommodation_enabled", True)
@@ -1573,7 +2207,7 @@ class GoHomeApp(ctk.CTk):
 
         engine = SegmentQueryEngine(
             mcp_manager=self.mcp_manager,
-            log_callback=log_callback,
+            log_callback=self.log_message,
             progress_callback=progress_callback,
             accommodation_threshold_hours=accommodation_threshold,
             accommodation_enabled=accommodation_enabled
@@ -1583,15 +2217,14 @@ class GoHomeApp(ctk.CTk):
             # 处理火车票日期限制
             train_date = calculate_adjusted_train_date(date)
             if train_date != date:
-                self.after(0, lambda td=train_date: self.log_message(
-                    f"[分段查询] 火车票日期调整为 {td}（12306 15天限制）"))
+                self.log_message(f"[分段查询] 火车票日期调整为 {train_date}（12306 15天限制）")
 
             # 预热机票服务（触发验证码处理，确保后续查询正常）
             if transport in ["all", "flight"] and self.mcp_manager.flight_running:
-                self.after(0, lambda: self.append_result("\n\n🔥 预热机票服务中（如有验证码请完成验证）..."))
+                self.post_ui(self.append_result, "\n\n🔥 预热机票服务中（如有验证码请完成验证）...")
                 warmup_success = engine.warmup_flight_service(test_date=date)
                 if not warmup_success:
-                    self.after(0, lambda: self.append_result("\n⚠️ 机票服务预热失败，机票查询可能受影响"))
+                    self.post_ui(self.append_result, "\n⚠️ 机票服务预热失败，机票查询可能受影响")
 
             # 构建所有分段查询请求
             queries = engine.build_segment_queries(
@@ -1603,8 +2236,8 @@ class GoHomeApp(ctk.CTk):
                 transport_filter=transport
             )
 
-            self.after(0, lambda n=len(queries): self.log_message(f"[分段查询] 共 {n} 个分段查询任务"))
-            self.after(0, lambda n=len(queries): self.append_result(f"\n📊 共 {n} 个分段查询任务，开始执行..."))
+            self.log_message(f"[分段查询] 共 {len(queries)} 个分段查询任务")
+            self.post_ui(self.append_result, f"\n📊 共 {len(queries)} 个分段查询任务，开始执行...")
 
             # 执行所有查询（火车票并行，机票串行）
             # 火车票并发数降到 5，避免触发 12306 限制
@@ -1622,8 +2255,8 @@ class GoHomeApp(ctk.CTk):
                 results=results
             )
 
-            self.after(0, lambda n=len(routes): self.log_message(f"[分段查询] 组合出 {n} 条可行路线"))
-            self.after(0, lambda n=len(routes): self.append_result(f"\n\n🛤️ 组合出 {n} 条可行路线，正在让 AI 分析..."))
+            self.log_message(f"[分段查询] 组合出 {len(routes)} 条可行路线")
+            self.post_ui(self.append_result, f"\n\n🛤️ 组合出 {len(routes)} 条可行路线，正在让 AI 分析...")
 
             # 保存原始查询数据（用于导出）
             self.last_query_data = {
@@ -1635,7 +2268,7 @@ class GoHomeApp(ctk.CTk):
                     "date": date,
                     "hub_cities": hub_cities,
                     "transport": transport,
-                    "priority": self.priority_var.get(),
+                    "priority": options["priority"],
                 },
             }
 
@@ -1650,29 +2283,28 @@ class GoHomeApp(ctk.CTk):
             )
 
             # 调用 AI 分析
-            self._call_ai_for_summary(summary_message)
+            self._call_ai_for_summary(summary_message, options)
 
         except Exception as e:
             error_msg = f"⚠️ 分段查询失败: {str(e)}"
-            self.after(0, lambda msg=error_msg: self.show_result(msg))
-            self.after(0, lambda err=str(e): self.log_message(f"[分段查询] 错误: {err}"))
+            self.post_ui(self.show_result, error_msg)
+            self.log_message(f"[分段查询] 错误: {str(e)}")
         finally:
-            self.after(0, self.hide_progress)
-            self.after(0, lambda: self.query_btn.configure(state="normal", text="🔍 开始查询"))
+            self.post_ui(self._finish_query_ui)
             self.is_querying = False
 
-    def _call_ai_for_summary(self, summary_message: str):
+    def _call_ai_for_summary(self, summary_message: str, options: Dict[str, Any]):
         """调用 AI 对查询结果进行汇总分析"""
-        api_key = self.api_key_entry.get()
-        base_url = self.api_url_entry.get()
-        model = self.model_combobox.get()
+        api_key = options["api_key"]
+        base_url = options["base_url"]
+        model = options["model"]
 
         # 获取住宿费用设置
         accommodation_enabled = self.config_manager.get("accommodation_enabled", True)
         threshold_hours = self.config_manager.get("accommodation_threshold", 6)
 
         try:
-            client = OpenAI(api_key=api_key, base_url=base_url)
+            client = self.get_openai_client(api_key, base_url)
 
             # 根据住宿费用开关构建提示词
             if accommodation_enabled:
@@ -1704,7 +2336,7 @@ class GoHomeApp(ctk.CTk):
                 accommodation_section = ""
 
             # 获取用户优先级偏好
-            priority = self.priority_var.get()
+            priority = options["priority"]
             priority_instruction = {
                 "cheap": "**重要**：用户选择了\"省钱优先\"，请务必推荐总价最低的方案（包含住宿费），即使需要多花一些时间。",
                 "fast": "**重要**：用户选择了\"省时优先\"，请务必推荐总时长最短的方案，价格可以适当高一些。",
@@ -1762,25 +2394,67 @@ class GoHomeApp(ctk.CTk):
                 {"role": "user", "content": summary_message}
             ]
 
-            self.after(0, lambda: self.log_message("[AI] 正在分析汇总结果..."))
+            self.log_message("[AI] 正在分析汇总结果...")
 
-            response = client.chat.completions.create(
+            final_content, _ = self._stream_chat_completion(
+                client,
                 model=model,
                 messages=messages,
                 temperature=0.7
             )
 
-            final_content = response.choices[0].message.content or "抱歉，无法生成分析结果。"
-
-            self.after(0, lambda msg=final_content: self.show_result(msg))
-            self.after(0, lambda: self.log_message("[AI] 汇总分析完成"))
+            if not final_content:
+                self.post_ui(self.show_result, "抱歉，无法生成分析结果。")
+            self.log_message("[AI] 汇总分析完成")
 
         except Exception as e:
             error_msg = f"⚠️ AI 分析失败: {str(e)}"
-            self.after(0, lambda msg=error_msg: self.show_result(msg))
-            self.after(0, lambda err=str(e): self.log_message(f"[AI] 汇总分析错误: {err}"))
+            self.post_ui(self.show_result, error_msg)
+            self.log_message(f"[AI] 汇总分析错误: {str(e)}")
+
+    def _stream_chat_completion(self, client: OpenAI, **kwargs) -> Tuple[str, List[Dict]]:
+        """
+        以流式方式调用 chat.completions，文本增量实时写入结果区
+
+        Returns:
+            (完整文本内容, 工具调用列表)，工具调用为 OpenAI 消息格式的字典
+        """
+        stream = client.chat.completions.create(stream=True, **kwargs)
+
+        content_parts: List[str] = []
+        # 按 index 拼接工具调用的增量片段
+        tool_calls: Dict[int, Dict] = {}
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
 
-    def call_ai_api(self, user_message: str):
+            if delta.content:
+                if content_parts:
+                    self.post_ui(self.append_result, delta.content)
+                else:
+                    # 本轮第一个文本片段：清空结果区
+                    self.post_ui(self.show_result, delta.content)
+                content_parts.append(delta.content)
+
+            for tc in delta.tool_calls or []:
+                entry = tool_calls.setdefault(tc.index, {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                if tc.id:
+                    entry["id"] = tc.id
+                if tc.function:
+                    if tc.function.name:
+                        entry["function"]["name"] += tc.function.name
+                    if tc.function.arguments:
+                        entry["function"]["arguments"] += tc.function.arguments
+
+        return "".join(content_parts), [tool_calls[i] for i in sorted(tool_calls)]
+
+    def call_ai_api(self, user_message: str, options: Dict[str, Any]):
         """调用 AI API 获取回复，支持 Function Calling"""
         # ============================================================
         # [临时测试] 超详细调试日志 - 调通后记得删除
@@ -1789,16 +2463,16 @@ class GoHomeApp(ctk.CTk):
         def debug_log(msg):
             """带时间戳的调试日志"""
             timestamp = time.strftime("%H:%M:%S")
-            self.after(0, lambda m=f"[DEBUG {timestamp}] {msg}": self.log_message(m))
+            self.log_message(f"[DEBUG {timestamp}] {msg}")
             # 同时输出到控制台（如果有）
-            print(f"[DEBUG {timestamp}] {msg}")
+            logger.info("[DEBUG %s] %s", timestamp, msg)
 
         debug_log("=== call_ai_api 开始 ===")
         debug_log(f"Python frozen: {getattr(sys, 'frozen', False)}")
 
-        api_key = self.api_key_entry.get()
-        base_url = self.api_url_entry.get()
-        model = self.model_combobox.get()
+        api_key = options["api_key"]
+        base_url = options["base_url"]
+        model = options["model"]
 
         debug_log(f"API Base URL: {base_url}")
         debug_log(f"Model: {model}")
@@ -1806,7 +2480,7 @@ class GoHomeApp(ctk.CTk):
 
         # 构建系统提示词
         debug_log("正在构建系统提示词...")
-        system_prompt = self.build_system_prompt()
+        system_prompt = self.build_system_prompt(options)
         debug_log(f"系统提示词长度: {len(system_prompt)} 字符")
 
         try:
@@ -1827,9 +2501,10 @@ class GoHomeApp(ctk.CTk):
             except Exception as ssl_err:
                 debug_log(f"SSL 证书检查失败: {ssl_err}")
 
-            debug_log("正在创建 OpenAI 客户端...")
-            client = OpenAI(api_key=api_key, base_url=base_url, timeout=60.0)
-            debug_log("OpenAI 客户端创建成功")
+            debug_log("正在获取 OpenAI 客户端...")
+            # with_options 返回的副本共享底层连接池
+            client = self.get_openai_client(api_key, base_url).with_options(timeout=60.0)
+            debug_log("OpenAI 客户端就绪")
 
             messages = [
                 {"role": "system", "content": system_prompt},
@@ -1839,22 +2514,20 @@ class GoHomeApp(ctk.CTk):
 
             # 获取可用的 MCP 工具
             debug_log("正在获取 MCP 工具列表...")
-            tools = self.mcp_manager.get_all_tools()
-            debug_log(f"获取到 {len(tools)} 个工具")
-
-            # 根据用户选择过滤工具
-            transport = self.transport_var.get()
+            # 根据用户选择获取过滤后的工具（已缓存）
+            transport = options["transport"]
             debug_log(f"交通方式选择: {transport}")
-            if transport == "flight":
-                tools = [t for t in tools if t["function"]["name"].startswith("flight_")]
-            elif transport == "train":
-                tools = [t for t in tools if t["function"]["name"].startswith("train_")]
+            tools = self.mcp_manager.get_tools_for_transport(transport)
             debug_log(f"过滤后工具数量: {len(tools)}")
 
             has_tools = len(tools) > 0
 
+            # 每轮请求相同的参数在循环外一次性确定
+            request_kwargs = {"model": model, "temperature": 0.7}
             if has_tools:
-                self.after(0, lambda: self.log_message(f"[AI] 可用工具数量: {len(tools)}"))
+                request_kwargs["tools"] = tools
+                request_kwargs["tool_choice"] = "auto"
+                self.log_message(f"[AI] 可用工具数量: {len(tools)}")
                 # 列出工具名称
                 tool_names = [t["function"]["name"] for t in tools]
                 debug_log(f"工具列表: {tool_names}")
@@ -1863,13 +2536,15 @@ class GoHomeApp(ctk.CTk):
             max_iterations = 10
             iteration = 0
             total_tool_calls = 0
+            # 每轮工具结果在 messages 中的下标，用于截断较早轮次的结果
+            tool_message_rounds: List[List[int]] = []
 
             while iteration < max_iterations:
                 iteration += 1
                 debug_log(f"=== 第 {iteration} 轮对话开始 ===")
-                self.after(0, lambda it=iteration: self.log_message(f"[AI] 第 {it} 轮对话"))
-                self.after(0, lambda it=iteration, tc=total_tool_calls: self.show_progress(
-                    it, max_iterations, f"🤖 AI对话中 (已调用{tc}个工具)"))
+                self.log_message(f"[AI] 第 {iteration} 轮对话")
+                self.post_ui(self.show_progress, iteration, max_iterations,
+                             f"🤖 AI对话中 (已调用{total_tool_calls}个工具)")
 
                 # 调用 AI API
                 debug_log(f"准备调用 API: {base_url}/chat/completions")
@@ -1878,96 +2553,86 @@ class GoHomeApp(ctk.CTk):
                 api_start_time = time.time()
                 debug_log(">>> 发送 API 请求...")
 
-                if has_tools:
-                    response = client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        tools=tools,
-                        tool_choice="auto",
-                        temperature=0.7
-                    )
-                else:
-                    response = client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        temperature=0.7
-                    )
+                # 流式调用 AI API，文本片段实时显示
+                content, tool_calls = self._stream_chat_completion(
+                    client, messages=messages, **request_kwargs
+                )
 
                 api_elapsed = time.time() - api_start_time
-                debug_log(f"<<< API 响应收到，耗时: {api_elapsed:.2f} 秒")
-
-                assistant_message = response.choices[0].message
-                debug_log(f"响应类型: {'有工具调用' if assistant_message.tool_calls else '纯文本回复'}")
+                debug_log(f"<<< API 响应接收完毕，耗时: {api_elapsed:.2f} 秒")
+                debug_log(f"响应类型: {'有工具调用' if tool_calls else '纯文本回复'}")
 
                 # 检查是否有工具调用
-                if assistant_message.tool_calls:
-                    debug_log(f"AI 请求调用 {len(assistant_message.tool_calls)} 个工具")
+                if tool_calls:
+                    debug_log(f"AI 请求调用 {len(tool_calls)} 个工具")
                     # 将助手消息添加到消息列表
                     messages.append({
                         "role": "assistant",
-                        "content": assistant_message.content,
-                        "tool_calls": [
-                            {
-                                "id": tc.id,
-                                "type": "function",
-                                "function": {
-                                    "name": tc.function.name,
-                                    "arguments": tc.function.arguments
-                                }
-                            }
-                            for tc in assistant_message.tool_calls
-                        ]
+                        "content": content or None,
+                        "tool_calls": tool_calls
                     })
 
-                    # 处理每个工具调用
-                    for tool_call in assistant_message.tool_calls:
-                        tool_name = tool_call.function.name
+                    # 解析所有工具调用参数
+                    calls = []
+                    for tool_call in tool_calls:
+                        tool_name = tool_call["function"]["name"]
                         debug_log(f"准备调用工具: {tool_name}")
-                        try:
-                            tool_args = json.loads(tool_call.function.arguments)
-                        except json.JSONDecodeError:
+                        raw_args = tool_call["function"]["arguments"]
+                        if not raw_args or raw_args == "{}":
+                            # 无参数工具直接使用空字典，跳过 JSON 解析
                             tool_args = {}
+                        else:
+                            try:
+                                tool_args = json_loads(raw_args)
+                            except json.JSONDecodeError:
+                                tool_args = {}
 
                         total_tool_calls += 1
-                        self.after(0, lambda tn=tool_name, ta=str(tool_args): self.log_message(f"[MCP] 调用工具: {tn}, 参数: {ta}"))
-                        self.after(0, lambda it=iteration, tc=total_tool_calls: self.show_progress(
-                            it, max_iterations, f"🤖 AI对话中 (已调用{tc}个工具)"))
-
-                        # 调用 MCP 工具
-                        debug_log(f">>> 调用 MCP 工具: {tool_name}")
-                        tool_start = time.time()
-                        tool_result = self.mcp_manager.call_tool(tool_name, tool_args)
-                        tool_elapsed = time.time() - tool_start
-                        debug_log(f"<<< MCP 工具返回，耗时: {tool_elapsed:.2f} 秒")
-
+                        self.log_message(f"[MCP] 调用工具: {tool_name}, 参数: {tool_args}")
+                        calls.append((tool_name, tool_args))
+
+                    self.post_ui(self.show_progress, iteration, max_iterations,
+                                 f"🤖 AI对话中 (已调用{total_tool_calls}个工具)")
+
+                    # 同一轮的多个工具调用并发执行
+                    debug_log(f">>> 并发调用 {len(calls)} 个 MCP 工具")
+                    tool_start = time.time()
+                    tool_results = self.mcp_manager.call_tools(calls, use_cache=True)
+                    tool_elapsed = time.time() - tool_start
+                    debug_log(f"<<< MCP 工具全部返回，耗时: {tool_elapsed:.2f} 秒")
+
+                    # 按原始顺序把工具结果添加到消息列表
+                    round_indices = []
+                    for tool_call, tool_result in zip(tool_calls, tool_results):
                         # 截断过长的结果用于日志显示
-                        log_result = tool_result[:200] + "..." if len(tool_result) > 200 else tool_result
-                        self.after(0, lambda lr=log_result: self.log_message(f"[MCP] 返回: {lr}"))
+                        self.log_message(f"[MCP] 返回: {truncate_text(tool_result, LOG_RESULT_PREVIEW_CHARS)}")
 
-                        # 将工具结果添加到消息列表
+                        round_indices.append(len(messages))
                         messages.append({
                             "role": "tool",
-                            "tool_call_id": tool_call.id,
+                            "tool_call_id": tool_call["id"],
                             "content": tool_result
                         })
-                        debug_log(f"工具结果已添加到消息列表")
+                    tool_message_rounds.append(round_indices)
+                    self._prune_tool_messages(messages, tool_message_rounds)
+                    debug_log(f"工具结果已添加到消息列表")
                 else:
                     # 没有工具调用，获取最终回复
                     debug_log("AI 返回最终回复，无需调用工具")
-                    final_content = assistant_message.content or "抱歉，我无法生成回复。"
-                    debug_log(f"最终回复长度: {len(final_content)} 字符")
+                    debug_log(f"最终回复长度: {len(content)} 字符")
 
-                    # 在主线程更新 UI
-                    self.after(0, lambda msg=final_content: self.show_result(msg))
-                    self.after(0, lambda: self.log_message("[AI] 查询完成"))
+                    # 回复已在流式接收时写入结果区，空回复时给出提示
+                    if not content:
+                        self.post_ui(self.show_result, "抱歉，我无法生成回复。")
+                    self.log_message("[AI] 查询完成")
                     debug_log("=== call_ai_api 正常结束 ===")
                     break
 
             else:
                 # 达到最大迭代次数
                 debug_log("达到最大迭代次数限制")
-                self.after(0, lambda: self.show_result("⚠️ 处理请求时超过了最大工具调用次数，请尝试简化您的问题。"))
-                self.after(0, lambda: self.log_message("[AI] 超过最大工具调用次数"))
+                self.post_ui(self.show_result, "⚠️ 处理请求时超过了最大工具调用次数，请尝试简化您的问题。")
+                self.log_message("[AI] 超过最大工具调用次数")
 
         except Exception as e:
             error_str = str(e)
@@ -1977,19 +2642,33 @@ class GoHomeApp(ctk.CTk):
             debug_log(f"!!! 异常堆栈:\n{traceback.format_exc()}")
 
             if "thought_signature" in error_str:
-                error_msg = "⚠️ AI 请求失败: 模型限制\n\n当前使用的是 thinking 类型模型，该类型模型在多轮工具调用时需要特殊处理。\n\n解决方案：请在 API 设置中选择一个非 thinking 的普通模型"
+                error_msg = AI_THINKING_MODEL_ERROR
             else:
-                error_msg = f"⚠️ AI 请求失败: {error_str}\n\n请检查：\n1. API Key 是否正确\n2. API Base URL 是否正确\n3. 网络连接是否正常\n4. MCP 服务是否已启动"
-            self.after(0, lambda msg=error_msg: self.show_result(msg))
-            self.after(0, lambda err=error_str: self.log_message(f"[AI] 错误: {err}"))
+                error_msg = f"⚠️ AI 请求失败: {error_str}{AI_ERROR_CHECKLIST}"
+            self.post_ui(self.show_result, error_msg)
+            self.log_message(f"[AI] 错误: {error_str}")
 
         finally:
             debug_log("=== call_ai_api finally 块执行 ===")
-            # 隐藏进度条并恢复查询按钮
-            self.after(0, self.hide_progress)
-            self.after(0, lambda: self.query_btn.configure(state="normal", text="🔍 开始查询"))
+            # 隐藏进度条并恢复查询按钮（经由同一队列，保证排在进度更新之后）
+            self.post_ui(self._finish_query_ui)
             self.is_querying = False
 
+    @staticmethod
+    def _prune_tool_messages(messages: List[Dict], tool_message_rounds: List[List[int]]):
+        """
+        截断较早轮次的工具结果
+
+        只保留最近 TOOL_HISTORY_KEEP_ROUNDS 轮的完整结果，更早的结果截断到
+        TOOL_HISTORY_MAX_CHARS 个字符，每条消息只在刚超出保留范围时处理一次。
+        """
+        if len(tool_message_rounds) <= TOOL_HISTORY_KEEP_ROUNDS:
+            return
+        for index in tool_message_rounds[-TOOL_HISTORY_KEEP_ROUNDS - 1]:
+            content = messages[index]["content"]
+            if len(content) > TOOL_HISTORY_MAX_CHARS:
+                messages[index]["content"] = content[:TOOL_HISTORY_MAX_CHARS] + "\n...[已截断]"
+
     def clear_browser_cookies(self):
         """清除浏览器cookie数据"""
         import shutil
@@ -2048,31 +2727,31 @@ class GoHomeApp(ctk.CTk):
         if response:
             self.clear_browser_cookies()
 
-        def start_services():
-            # 启动机票服务
-            if self.mcp_manager.start_flight_mcp(self.log_message):
-                self.after(0, lambda: self.flight_status.configure(text_color="green"))
-            else:
-                self.after(0, lambda: self.flight_status.configure(text_color="red"))
-
-            # 启动火车票服务
-            if self.mcp_manager.start_train_mcp(self.log_message):
-                self.after(0, lambda: self.train_status.configure(text_color="green"))
-            else:
-                self.after(0, lambda: self.train_status.configure(text_color="red"))
-
-            self.after(0, lambda: self.log_message("服务启动完成！"))
-
-        thread = threading.Thread(target=start_services, daemon=True)
-        thread.start()
+        # 机票和火车票服务直接提交到线程池并行启动，各自握手完成后由监听器更新状态指示；
+        # 不在池内任务中等待另一批池内任务，避免占住工作线程
+        futures = [
+            self.run_in_background(self.mcp_manager.start_flight_mcp, self.log_message),
+            self.run_in_background(self.mcp_manager.start_train_mcp, self.log_message),
+        ]
+        pending = [len(futures)]
+        pending_lock = threading.Lock()
+
+        def on_service_started(_future):
+            # 最后一个启动任务完成时记录日志
+            with pending_lock:
+                pending[0] -= 1
+                finished = pending[0] == 0
+            if finished:
+                self.log_message("服务启动完成！")
+
+        for future in futures:
+            future.add_done_callback(on_service_started)
 
     def stop_all_services(self):
         """停止所有服务"""
         self.log_message("-" * 50)
         self.log_message("正在停止 MCP 服务...")
         self.mcp_manager.stop_all(self.log_message)
-        self.flight_status.configure(text_color="gray")
-        self.train_status.configure(text_color="gray")
         self.log_message("所有服务已停止")
 
     def save_api_config(self):
@@ -2085,10 +2764,11 @@ class GoHomeApp(ctk.CTk):
         threshold_hours = int(threshold_str.replace(" 小时", ""))
         self.config_manager.set("accommodation_threshold", threshold_hours)
         self.config_manager.save_config()
+        self.clear_openai_clients()
         self.log_message(f"配置已保存（住宿阈值: {threshold_hours}小时）")
 
     def fetch_available_models(self):
-        """获取可用模型列表"""
+        """获取可用模型列表（优先使用磁盘缓存，缓存过期时后台刷新）"""
         api_key = self.api_key_entry.get()
         base_url = self.api_url_entry.get()
 
@@ -2096,12 +2776,31 @@ class GoHomeApp(ctk.CTk):
             self.log_message("[错误] 请先填写 API Key")
             return
 
-        self.log_message(f"正在获取模型列表: {base_url}")
+        # 已有进行中的请求时不重复发起，结果返回后统一更新
+        if self._models_future is not None and not self._models_future.done():
+            self.log_message("模型列表正在获取中，请稍候...")
+            return
+
+        cached = self.model_cache.get(base_url)
+        if cached:
+            cached_ids, fresh = cached
+            self._apply_model_list(cached_ids)
+            self.log_message(f"[缓存] 已加载 {len(cached_ids)} 个可用模型")
+            if fresh:
+                return
+            self.log_message(f"模型列表缓存已过期，正在后台刷新: {base_url}")
+        else:
+            self.log_message(f"正在获取模型列表: {base_url}")
         self.fetch_models_btn.configure(state="disabled")
 
         def fetch_models():
+            # 本次获取产生的所有 UI 更新，结束时一次性投递
+            updates = []
             try:
-                client = OpenAI(api_key=api_key, base_url=base_url)
+                # 获取模型列表是轻量请求，使用较短的超时
+                client = self.get_openai_client(api_key, base_url).with_options(
+                    timeout=httpx.Timeout(10.0, connect=5.0)
+                )
                 models_response = client.models.list()
 
                 # 提取模型ID列表
@@ -2109,36 +2808,45 @@ class GoHomeApp(ctk.CTk):
                 model_ids.sort()
 
                 if model_ids:
-                    self.available_models = model_ids
-                    current_model = self.model_combobox.get()
-
-                    self.after(0, lambda: self.model_combobox.configure(values=model_ids))
-
-                    # 如果当前选择的模型在列表中，保持选择
-                    if current_model in model_ids:
-                        self.after(0, lambda: self.model_combobox.set(current_model))
-                    else:
-                        self.after(0, lambda: self.model_combobox.set(model_ids[0]))
-
-                    self.after(0, lambda: self.log_message(f"[成功] 获取到 {len(model_ids)} 个可用模型"))
+                    self.model_cache.set(base_url, model_ids)
+                    updates.append((self._apply_model_list, (model_ids,)))
+                    updates.append((self.log_message, (f"[成功] 获取到 {len(model_ids)} 个可用模型",)))
                 else:
-                    self.after(0, lambda: self.log_message("[警告] 未获取到任何模型"))
+                    updates.append((self.log_message, ("[警告] 未获取到任何模型",)))
 
             except Exception as e:
-                self.after(0, lambda: self.log_message(f"[失败] 获取模型列表失败: {str(e)}"))
+                updates.append((self.log_message, (f"[失败] 获取模型列表失败: {str(e)}",)))
 
             finally:
-                self.after(0, lambda: self.fetch_models_btn.configure(state="normal"))
+                updates.append((lambda: self.fetch_models_btn.configure(state="normal"), ()))
+                self.post_ui(self._apply_ui_updates, updates)
 
-        thread = threading.Thread(target=fetch_models, daemon=True)
-        thread.start()
+        self._models_future = self.run_in_background(fetch_models)
+
+    def _preload_models(self):
+        """启动时若当前 API 地址有模型列表缓存则直接加载，过期时后台刷新"""
+        if self.api_key_entry.get() and self.model_cache.get(self.api_url_entry.get()):
+            self.fetch_available_models()
+
+    def _apply_model_list(self, model_ids: List[str]):
+        """用模型列表更新下拉框（主线程调用），列表未变化时不重建下拉菜单"""
+        if model_ids == self.available_models:
+            return
+        self.available_models = model_ids
+        current_model = self.model_combobox.get()
+        self.model_combobox.configure(values=model_ids)
+
+        # 如果当前选择的模型在列表中，保持选择
+        if current_model in model_ids:
+            self.model_combobox.set(current_model)
+        else:
+            self.model_combobox.set(model_ids[0])
 
     def toggle_accommodation(self):
         """切换住宿费用计算开关"""
         enabled = self.accommodation_enabled_var.get() == "on"
         self._update_accommodation_ui_state()
         self.config_manager.set("accommodation_enabled", enabled)
-        self.config_manager.save_config()
         if enabled:
             self.log_message("[设置] 已启用住宿费用计算")
         else:
@@ -2270,19 +2978,26 @@ class GoHomeApp(ctk.CTk):
         """切换主题"""
         ctk.set_appearance_mode(theme)
         self.config_manager.set("theme", theme)
-        self.config_manager.save_config()
         self.log_message(f"主题已切换为: {theme}")
 
     def on_closing(self):
         """关闭窗口时的处理"""
         self.log_message("正在关闭程序...")
-        self.mcp_manager.stop_all()
         self.config_manager.save_config()
-        self.destroy()
+        # 先隐藏窗口，MCP 服务在后台停止；非守护线程保证进程退出前清理完成
+        self.withdraw()
+        threading.Thread(
+            target=self.mcp_manager.stop_all,
+            kwargs={"timeout": MCP_EXIT_STOP_TIMEOUT},
+            name="mcp-shutdown",
+        ).start()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.after(200, self.destroy)
 
 
 def main():
     """主函数"""
+    setup_logging()
     app = GoHomeApp()
     app.mainloop()
 
@@ -22,6 +22,32 @@ from dataclasses import dataclass, field
 from enum import Enum
 
 
+MINUTES_PER_DAY = 24 * 60
+
+# 解析用的正则表达式，模块加载时编译一次
+_RE_NUMBER = re.compile(r'(\d+)')
+_RE_CROSS_DAY = re.compile(r'\+\d+天?')
+_RE_HHMM = re.compile(r'(\d{1,2}):(\d{2})')
+_RE_HOURS = re.compile(r'(\d+)\s*[小时hH]')
+_RE_MINUTES = re.compile(r'(\d+)\s*[分钟mM]')
+# 匹配类似: CA1234 08:00-11:00 ¥1000
+_RE_FLIGHT_TEXT = re.compile(r'([A-Z]{2}\d{3,4})\s+(\d{1,2}:\d{2})[^\d]*(\d{1,2}:\d{2})[^\d¥]*[¥￥]?(\d+)')
+# 匹配类似: G1234 08:00-11:00 ¥500
+_RE_TRAIN_TEXT = re.compile(r'([GDCKTZ]\d{1,4})\s+(\d{1,2}:\d{2})[^\d]*(\d{1,2}:\d{2})[^\d¥]*[¥￥]?(\d+)')
+
+
+def _parse_hhmm(time_str: str) -> Optional[int]:
+    """把 HH:MM 转换为当天零点起的分钟数，格式无效时返回 None"""
+    try:
+        hour_str, minute_str = time_str.split(":")
+        hour, minute = int(hour_str), int(minute_str)
+    except (AttributeError, ValueError):
+        return None
+    if 0 <= hour < 24 and 0 <= minute < 60:
+        return hour * 60 + minute
+    return None
+
+
 class TransportType(Enum):
     """交通类型"""
     FLIGHT = "flight"
@@ -58,6 +84,20 @@ class TransportSegment:
     seat_types: Dict[str, int] = field(default_factory=dict)  # 座位类型及价格
     # 原始数据
     raw_data: Dict = field(default_factory=dict)
+    # 预先计算的时刻（分钟数），换乘计算只做整数运算，时间无效时为 None
+    dep_minutes: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+    # 到达时刻，相对出发当天零点并已计入跨天
+    arr_minutes: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.dep_minutes = _parse_hhmm(self.departure_time)
+        arr = _parse_hhmm(self.arrival_time)
+        if arr is not None:
+            try:
+                arr += int(self.cross_days) * MINUTES_PER_DAY
+            except (TypeError, ValueError):
+                arr = None
+        self.arr_minutes = arr
 
     def get_departure_datetime(self, base_date: str) -> datetime:
         """获取出发日期时间"""
@@ -196,7 +236,7 @@ class RouteCalculator:
             price = 0
             price_str = flight.get("价格", flight.get("price", "0"))
             if isinstance(price_str, str):
-                price_match = re.search(r'(\d+)', price_str.replace(",", ""))
+                price_match = _RE_NUMBER.search(price_str.replace(",", ""))
                 if price_match:
                     price = int(price_match.group(1))
             else:
@@ -262,9 +302,7 @@ class RouteCalculator:
         """从文本中提取航班信息（备用方案）"""
         segments = []
         # 简单的正则匹配
-        # 匹配类似: CA1234 08:00-11:00 ¥1000
-        pattern = r'([A-Z]{2}\d{3,4})\s+(\d{1,2}:\d{2})[^\d]*(\d{1,2}:\d{2})[^\d¥]*[¥￥]?(\d+)'
-        matches = re.findall(pattern, text)
+        matches = _RE_FLIGHT_TEXT.findall(text)
         for match in matches:
             flight_no, dep_time, arr_time, price = match
             segments.append(TransportSegment(
@@ -367,7 +405,7 @@ class RouteCalculator:
                 p = train.get(cn_name, train.get(en_name, ""))
                 if p and p != "--" and p != "无":
                     try:
-                        p_val = int(re.search(r'(\d+)', str(p).replace(",", "")).group(1))
+                        p_val = int(_RE_NUMBER.search(str(p).replace(",", "")).group(1))
                         seat_types[cn_name] = p_val
                         if price == 0 or p_val < price:
                             price = p_val
@@ -378,7 +416,7 @@ class RouteCalculator:
             if price == 0:
                 price_str = train.get("价格", train.get("price", "0"))
                 if isinstance(price_str, str):
-                    match = re.search(r'(\d+)', price_str.replace(",", ""))
+                    match = _RE_NUMBER.search(price_str.replace(",", ""))
                     if match:
                         price = int(match.group(1))
                 elif isinstance(price_str, (int, float)):
@@ -425,9 +463,7 @@ class RouteCalculator:
     def _parse_train_from_text(self, text: str, departure_city: str, arrival_city: str) -> List[TransportSegment]:
         """从文本中提取火车信息（备用方案）"""
         segments = []
-        # 匹配类似: G1234 08:00-11:00 ¥500
-        pattern = r'([GDCKTZ]\d{1,4})\s+(\d{1,2}:\d{2})[^\d]*(\d{1,2}:\d{2})[^\d¥]*[¥￥]?(\d+)'
-        matches = re.findall(pattern, text)
+        matches = _RE_TRAIN_TEXT.findall(text)
         for match in matches:
             train_no, dep_time, arr_time, price = match
             segments.append(TransportSegment(
@@ -447,9 +483,9 @@ class RouteCalculator:
         if not time_str:
             return ""
         # 移除跨天标记
-        time_str = re.sub(r'\+\d+天?', '', str(time_str)).strip()
+        time_str = _RE_CROSS_DAY.sub('', str(time_str)).strip()
         # 提取时间
-        match = re.search(r'(\d{1,2}):(\d{2})', time_str)
+        match = _RE_HHMM.search(time_str)
         if match:
             return f"{int(match.group(1)):02d}:{match.group(2)}"
         return time_str
@@ -460,11 +496,11 @@ class RouteCalculator:
             return 0
         total_minutes = 0
         # 匹配小时
-        hour_match = re.search(r'(\d+)\s*[小时hH]', str(duration_str))
+        hour_match = _RE_HOURS.search(str(duration_str))
         if hour_match:
             total_minutes += int(hour_match.group(1)) * 60
         # 匹配分钟
-        min_match = re.search(r'(\d+)\s*[分钟mM]', str(duration_str))
+        min_match = _RE_MINUTES.search(str(duration_str))
         if min_match:
             total_minutes += int(min_match.group(1))
         return total_minutes
@@ -680,6 +716,8 @@ class RouteCalculator:
         - flight -> train
         - train -> flight
         - train -> train
+
+        只返回换乘可行的方案
         """
         routes = []
         transport_combos = [
@@ -694,26 +732,25 @@ class RouteCalculator:
                 key1 = f"{origin}_{hub}_{type1}"
                 key2 = f"{hub}_{destination}_{type2}"
 
-                segments1 = parsed_segments.get(key1, [])
-                segments2 = parsed_segments.get(key2, [])
+                # 无价格的选项一次性剔除，避免在内层循环中反复判断
+                segments1 = [seg for seg in parsed_segments.get(key1, []) if seg.price > 0]
+                if not segments1:
+                    continue
+                segments2 = [seg for seg in parsed_segments.get(key2, []) if seg.price > 0]
 
-                # 对每个第一段，找可行的第二段
+                # 对每个第一段，找可行的第二段（不可行的组合最终会被过滤，不再生成方案对象）
                 for seg1 in segments1:
-                    if seg1.price <= 0:
-                        continue
-
                     for seg2 in segments2:
-                        if seg2.price <= 0:
-                            continue
-
                         # 检查换乘可行性
-                        feasible, wait_minutes, reason = self._check_transfer_feasibility(
+                        feasible, wait_minutes, _ = self._check_transfer_feasibility(
                             seg1, seg2, date, min_transfer_hours
                         )
+                        if not feasible:
+                            continue
 
                         # 计算住宿费
                         accommodation = 0
-                        if feasible and self.accommodation_enabled:
+                        if self.accommodation_enabled:
                             accommodation = self._calculate_accommodation_fee(
                                 seg1, seg2, date, wait_minutes
                             )
@@ -729,9 +766,7 @@ class RouteCalculator:
                             total_duration_minutes=total_duration,
                             accommodation_fee=accommodation,
                             transfer_wait_minutes=[wait_minutes],
-                            route_type=f"{type1}_{type2}",
-                            feasible=feasible,
-                            infeasible_reason=reason
+                            route_type=f"{type1}_{type2}"
                         )
                         routes.append(route)
 
@@ -749,7 +784,7 @@ class RouteCalculator:
         """
         计算三段中转方案
 
-        8种组合
+        8种组合，只返回两次换乘都可行的方案
         """
         routes = []
         transport_types = ["flight", "train"]
@@ -765,58 +800,60 @@ class RouteCalculator:
         if len(hub_cities) < 2:
             return routes
 
+        # 限制每段只取前3个选项，避免组合爆炸；无价格的选项一次性剔除
+        top_segments = {
+            key: [seg for seg in segments[:3] if seg.price > 0]
+            for key, segments in parsed_segments.items()
+        }
+
         # 遍历所有两两中转城市组合
-        for i, hub1 in enumerate(hub_cities):
+        for hub1 in hub_cities:
             for hub2 in hub_cities:
                 if hub1 == hub2:
                     continue
 
                 for type1, type2, type3 in combos:
-                    key1 = f"{origin}_{hub1}_{type1}"
-                    key2 = f"{hub1}_{hub2}_{type2}"
-                    key3 = f"{hub2}_{destination}_{type3}"
-
-                    segments1 = parsed_segments.get(key1, [])
-                    segments2 = parsed_segments.get(key2, [])
-                    segments3 = parsed_segments.get(key3, [])
-
-                    # 限制每段只取前3个选项，避免组合爆炸
-                    for seg1 in segments1[:3]:
-                        if seg1.price <= 0:
-                            continue
+                    segments1 = top_segments.get(f"{origin}_{hub1}_{type1}")
+                    segments2 = top_segments.get(f"{hub1}_{hub2}_{type2}")
+                    segments3 = top_segments.get(f"{hub2}_{destination}_{type3}")
+                    if not segments1 or not segments2 or not segments3:
+                        continue
 
-                        for seg2 in segments2[:3]:
-                            if seg2.price <= 0:
+                    # 第二次换乘只取决于第二、三段的时刻，与第一段无关，
+                    # 对每个第二段预先算好可行的第三段，供所有第一段复用
+                    second_transfers = []
+                    for seg2 in segments2:
+                        options = []
+                        for seg3 in segments3:
+                            feasible2, wait2, _ = self._check_transfer_feasibility(
+                                seg2, seg3, date, min_transfer_hours
+                            )
+                            if not feasible2:
                                 continue
+                            acc2 = 0
+                            if self.accommodation_enabled:
+                                acc2 = self._calculate_accommodation_fee(seg2, seg3, date, wait2)
+                            options.append((seg3, wait2, acc2))
+                        if options:
+                            second_transfers.append((seg2, options))
+                    if not second_transfers:
+                        continue
 
+                    for seg1 in segments1:
+                        for seg2, options in second_transfers:
                             # 检查第一次换乘
-                            feasible1, wait1, reason1 = self._check_transfer_feasibility(
+                            feasible1, wait1, _ = self._check_transfer_feasibility(
                                 seg1, seg2, date, min_transfer_hours
                             )
                             if not feasible1:
                                 continue
 
-                            for seg3 in segments3[:3]:
-                                if seg3.price <= 0:
-                                    continue
-
-                                # 计算seg2到达日期（考虑跨天）
-                                seg2_date = self._get_arrival_date(seg1, seg2, date, wait1)
-
-                                # 检查第二次换乘
-                                feasible2, wait2, reason2 = self._check_transfer_feasibility(
-                                    seg2, seg3, seg2_date, min_transfer_hours
-                                )
-
-                                feasible = feasible1 and feasible2
-                                reason = reason1 or reason2
+                            acc1 = 0
+                            if self.accommodation_enabled:
+                                acc1 = self._calculate_accommodation_fee(seg1, seg2, date, wait1)
 
-                                # 计算住宿费
-                                accommodation = 0
-                                if feasible and self.accommodation_enabled:
-                                    acc1 = self._calculate_accommodation_fee(seg1, seg2, date, wait1)
-                                    acc2 = self._calculate_accommodation_fee(seg2, seg3, seg2_date, wait2)
-                                    accommodation = acc1 + acc2
+                            for seg3, wait2, acc2 in options:
+                                accommodation = acc1 + acc2
 
                                 total_price = seg1.price + seg2.price + seg3.price + accommodation
                                 total_duration = (seg1.duration_minutes + wait1 +
@@ -831,9 +868,7 @@ class RouteCalculator:
                                     total_duration_minutes=total_duration,
                                     accommodation_fee=accommodation,
                                     transfer_wait_minutes=[wait1, wait2],
-                                    route_type=f"{type1}_{type2}_{type3}",
-                                    feasible=feasible,
-                                    infeasible_reason=reason
+                                    route_type=f"{type1}_{type2}_{type3}"
                                 )
                                 routes.append(route)
 
@@ -858,51 +893,27 @@ class RouteCalculator:
         Returns:
             (是否可行, 等待分钟数, 不可行原因)
         """
-        try:
-            # 计算第一段到达时间
-            arr_dt = seg1.get_arrival_datetime(base_date)
-
-            # 计算最早可乘坐第二段的时间
-            min_transfer_minutes = min_transfer_hours * 60
-            earliest_dep = arr_dt + timedelta(minutes=min_transfer_minutes)
-
-            # 第二段出发时间（可能是当天或次日）
-            dep_time_str = seg2.departure_time
-            dep_hour, dep_min = map(int, dep_time_str.split(":"))
-
-            # 尝试当天和次日
-            for day_offset in range(3):  # 最多看后3天
-                dep_dt = arr_dt.replace(hour=dep_hour, minute=dep_min, second=0, microsecond=0)
-                dep_dt += timedelta(days=day_offset)
-
-                if dep_dt >= earliest_dep:
-                    wait_minutes = int((dep_dt - arr_dt).total_seconds() / 60)
-
-                    # 检查等待时间是否合理（不超过24小时）
-                    if wait_minutes <= 24 * 60:
-                        return True, wait_minutes, ""
-                    else:
-                        return False, wait_minutes, f"等待时间过长({wait_minutes // 60}小时)"
-
-            return False, 0, "未找到可行的换乘班次"
-
-        except Exception as e:
-            return False, 0, f"计算换乘出错: {str(e)}"
-
-    def _get_arrival_date(
-        self,
-        seg1: TransportSegment,
-        seg2: TransportSegment,
-        base_date: str,
-        wait_minutes: int
-    ) -> str:
-        """获取第二段出发日期"""
-        try:
-            arr_dt = seg1.get_arrival_datetime(base_date)
-            dep_dt = arr_dt + timedelta(minutes=wait_minutes)
-            return dep_dt.strftime("%Y-%m-%d")
-        except:
-            return base_date
+        arr_total = seg1.arr_minutes
+        dep_min = seg2.dep_minutes
+        if arr_total is None or dep_min is None:
+            return False, 0, (f"计算换乘出错: 时间格式无效 "
+                              f"({seg1.arrival_time!r} -> {seg2.departure_time!r})")
+
+        # 以第一段出发当天零点为基准，按分钟计算
+        earliest_dep = arr_total + min_transfer_hours * 60
+        # 第二段出发时间（到达当天或之后，最多看后3天）
+        dep_total = arr_total - arr_total % MINUTES_PER_DAY + dep_min
+        for _ in range(3):
+            if dep_total >= earliest_dep:
+                wait_minutes = dep_total - arr_total
+
+                # 检查等待时间是否合理（不超过24小时）
+                if wait_minutes <= MINUTES_PER_DAY:
+                    return True, wait_minutes, ""
+                return False, wait_minutes, f"等待时间过长({wait_minutes // 60}小时)"
+            dep_total += MINUTES_PER_DAY
+
+        return False, 0, "未找到可行的换乘班次"
 
     def _calculate_accommodation_fee(
         self,
@@ -923,25 +934,19 @@ class RouteCalculator:
             if wait_minutes < self.LONG_WAIT_THRESHOLD_HOURS * 60:
                 return 0
 
-        # 检查是否跨夜间
-        try:
-            arr_dt = seg1.get_arrival_datetime(base_date)
-            dep_dt = arr_dt + timedelta(minutes=wait_minutes)
-
-            # 检查等待期间是否包含夜间时段
-            current = arr_dt
-            while current < dep_dt:
-                hour = current.hour
-                if hour >= self.NIGHT_START_HOUR or hour < self.NIGHT_END_HOUR:
-                    return self.DEFAULT_ACCOMMODATION_FEE
-                current += timedelta(hours=1)
-
-            # 超长等待也需要住宿
-            if wait_minutes >= self.LONG_WAIT_THRESHOLD_HOURS * 60:
+        arr_total = seg1.arr_minutes
+        if arr_total is None:
+            return 0
+
+        # 检查等待期间是否包含夜间时段（从到达时刻起每小时检查一次）
+        for elapsed in range(0, wait_minutes, 60):
+            hour = (arr_total + elapsed) // 60 % 24
+            if hour >= self.NIGHT_START_HOUR or hour < self.NIGHT_END_HOUR:
                 return self.DEFAULT_ACCOMMODATION_FEE
 
-        except:
-            pass
+        # 超长等待也需要住宿
+        if wait_minutes >= self.LONG_WAIT_THRESHOLD_HOURS * 60:
+            return self.DEFAULT_ACCOMMODATION_FEE
 
         return 0
 
@@ -68,6 +68,77 @@ INTERNATIONAL_CITIES: Set[str] = {
 }
 
 
+# MCP 工具返回内容中的常见错误标识（两个 MCP 服务出错时都只返回普通文本）
+RESULT_ERROR_INDICATORS = (
+    "超时",
+    "timeout",
+    "error",
+    "failed",
+    "失败",
+    "异常",
+    "exception",
+    "无法",
+    "cannot",
+    "未找到",
+    "not found",
+    "无数据",
+    "no data",
+    "查询失败"
+)
+
+# 有效的火车票和机票数据通常包含这些关键字
+RESULT_VALID_INDICATORS = (
+    "flight",
+    "train",
+    "航班",
+    "车次",
+    "price",
+    "价格",
+    "departure",
+    "arrival",
+    "出发",
+    "到达"
+)
+
+# 查询成功但没有结果（可能是反爬或页面问题，重试可能得到数据）
+RESULT_EMPTY_INDICATORS = (
+    "找到 0 条航班",
+    "0条航班",
+    "未查到",
+    "很抱歉",
+)
+
+
+def is_valid_tool_result(data: str) -> bool:
+    """
+    检查MCP工具返回的数据是否有效
+
+    Args:
+        data: MCP工具返回的字符串数据
+
+    Returns:
+        True 如果数据有效，False 如果是错误或超时
+    """
+    if not data:
+        return False
+
+    # 转为小写进行检查
+    data_lower = data.lower()
+
+    if any(indicator in data_lower for indicator in RESULT_ERROR_INDICATORS):
+        return False
+
+    # 至少包含一个有效标识才认为是有效数据
+    return any(indicator in data_lower for indicator in RESULT_VALID_INDICATORS)
+
+
+def is_cacheable_tool_result(data: str) -> bool:
+    """检查工具结果是否可以缓存：有效且不是空结果（空结果和错误都应允许重试）"""
+    if not is_valid_tool_result(data):
+        return False
+    return not any(indicator in data for indicator in RESULT_EMPTY_INDICATORS)
+
+
 def is_international_city(city: str) -> bool:
     """
     检查城市是否是国际城市（无法查询中国火车票）
@@ -178,53 +249,7 @@ class SegmentQueryEngine:
         Returns:
             True 如果数据有效，False 如果是错误或超时
         """
-        if not data:
-            return False
-
-        # 转为小写进行检查
-        data_lower = data.lower()
-
-        # 检查常见的错误标识
-        error_indicators = [
-            "超时",
-            "timeout",
-            "error",
-            "failed",
-            "失败",
-            "异常",
-            "exception",
-            "无法",
-            "cannot",
-            "未找到",
-            "not found",
-            "无数据",
-            "no data",
-            "查询失败"
-        ]
-
-        for indicator in error_indicators:
-            if indicator in data_lower:
-                return False
-
-        # 检查是否包含有效数据的标识（JSON格式或结构化数据）
-        # 火车票和机票数据通常包含这些关键字
-        valid_indicators = [
-            "flight",
-            "train",
-            "航班",
-            "车次",
-            "price",
-            "价格",
-            "departure",
-            "arrival",
-            "出发",
-            "到达"
-        ]
-
-        # 至少包含一个有效标识才认为是有效数据
-        has_valid_indicator = any(indicator in data_lower for indicator in valid_indicators)
-
-        return has_valid_indicator
+        return is_valid_tool_result(data)
 
     def get_smart_hub_cities(
         self,
@@ -0,0 +1,228 @@
+"""
+换乘计算回归测试：整数分钟实现与原 datetime 实现的结果对比
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from route_calculator import RouteCalculator, TransportSegment, TransportType
+
+BASE_DATE = "2024-01-31"
+
+
+def make_segment(dep, arr, cross_days=0, price=500, duration=120, number="CA1"):
+    return TransportSegment(
+        transport_type=TransportType.FLIGHT,
+        carrier="国航",
+        number=number,
+        departure_time=dep,
+        arrival_time=arr,
+        cross_days=cross_days,
+        duration_minutes=duration,
+        price=price,
+    )
+
+
+# ---- 改用分钟数之前的实现（datetime 逐步推算），作为对比基准 ----
+
+def legacy_check_transfer(seg1, seg2, base_date, min_transfer_hours):
+    try:
+        arr_dt = seg1.get_arrival_datetime(base_date)
+        earliest_dep = arr_dt + timedelta(minutes=min_transfer_hours * 60)
+        dep_hour, dep_min = map(int, seg2.departure_time.split(":"))
+        for day_offset in range(3):
+            dep_dt = arr_dt.replace(hour=dep_hour, minute=dep_min, second=0, microsecond=0)
+            dep_dt += timedelta(days=day_offset)
+            if dep_dt >= earliest_dep:
+                wait_minutes = int((dep_dt - arr_dt).total_seconds() / 60)
+                return wait_minutes <= 24 * 60, wait_minutes
+        return False, 0
+    except Exception:
+        return False, 0
+
+
+def legacy_accommodation_fee(calc, seg1, base_date, wait_minutes):
+    if wait_minutes < calc.accommodation_threshold_hours * 60:
+        if wait_minutes < calc.LONG_WAIT_THRESHOLD_HOURS * 60:
+            return 0
+    try:
+        arr_dt = seg1.get_arrival_datetime(base_date)
+        dep_dt = arr_dt + timedelta(minutes=wait_minutes)
+        current = arr_dt
+        while current < dep_dt:
+            if current.hour >= calc.NIGHT_START_HOUR or current.hour < calc.NIGHT_END_HOUR:
+                return calc.DEFAULT_ACCOMMODATION_FEE
+            current += timedelta(hours=1)
+        if wait_minutes >= calc.LONG_WAIT_THRESHOLD_HOURS * 60:
+            return calc.DEFAULT_ACCOMMODATION_FEE
+    except Exception:
+        pass
+    return 0
+
+
+# (第一段出发, 第一段到达, 跨天数, 第二段出发, 最小换乘小时, 预期可行, 预期等待分钟)
+TRANSFER_CASES = [
+    ("08:00", "10:00", 0, "12:00", 2, True, 120),
+    ("08:00", "10:00", 0, "13:30", 3, True, 210),
+    ("08:00", "10:00", 0, "10:00", 2, True, 1440),
+    ("08:00", "10:00", 0, "11:59", 2, False, 1559),
+    ("08:00", "22:30", 0, "07:15", 2, True, 525),
+    ("20:00", "23:50", 0, "01:00", 2, False, 1510),
+    ("22:00", "01:30", 1, "06:00", 2, True, 270),
+    ("22:00", "01:30", 1, "03:00", 2, False, 1530),
+    ("21:00", "05:00", 2, "09:00", 3, True, 240),
+]
+
+
+@pytest.fixture
+def calc():
+    return RouteCalculator(accommodation_threshold_hours=6, accommodation_enabled=True)
+
+
+class TestTransferFeasibility:
+    """换乘可行性与等待时间"""
+
+    @pytest.mark.parametrize("dep1, arr1, cross, dep2, hours, feasible, wait", TRANSFER_CASES)
+    def test_fixed_cases(self, calc, dep1, arr1, cross, dep2, hours, feasible, wait):
+        seg1 = make_segment(dep1, arr1, cross)
+        seg2 = make_segment(dep2, "23:00")
+        ok, wait_minutes, _ = calc._check_transfer_feasibility(seg1, seg2, BASE_DATE, hours)
+        assert (ok, wait_minutes) == (feasible, wait)
+        assert (ok, wait_minutes) == legacy_check_transfer(seg1, seg2, BASE_DATE, hours)
+
+    def test_matches_legacy_on_time_grid(self, calc):
+        for arr_hour in range(0, 24, 3):
+            for cross in (0, 1):
+                seg1 = make_segment("06:00", f"{arr_hour:02d}:20", cross)
+                for dep_hour in range(0, 24):
+                    seg2 = make_segment(f"{dep_hour:02d}:05", "23:00")
+                    for hours in (2, 3):
+                        ok, wait, _ = calc._check_transfer_feasibility(seg1, seg2, BASE_DATE, hours)
+                        assert (ok, wait) == legacy_check_transfer(seg1, seg2, BASE_DATE, hours)
+
+    @pytest.mark.parametrize("arr1, dep2", [("", "12:00"), ("10:00", "待定"), ("25:00", "12:00")])
+    def test_invalid_time_is_infeasible(self, calc, arr1, dep2):
+        seg1 = make_segment("08:00", arr1)
+        seg2 = make_segment(dep2, "23:00")
+        ok, wait, reason = calc._check_transfer_feasibility(seg1, seg2, BASE_DATE, 2)
+        assert (ok, wait) == (False, 0)
+        assert reason.startswith("计算换乘出错")
+
+
+class TestAccommodationFee:
+    """住宿费：等待跨越夜间或超长等待"""
+
+    @pytest.mark.parametrize(
+        "arr1, cross, wait, expected",
+        [
+            ("10:00", 0, 120, 0),
+            ("10:00", 0, 7 * 60, 0),
+            ("16:00", 0, 7 * 60, 200),
+            ("22:30", 0, 525, 200),
+            ("01:30", 1, 6 * 60, 200),
+            ("06:00", 0, 12 * 60, 200),
+            ("06:00", 0, 11 * 60 + 59, 0),
+        ],
+    )
+    def test_fixed_cases(self, calc, arr1, cross, wait, expected):
+        seg1 = make_segment("00:10", arr1, cross)
+        seg2 = make_segment("23:00", "23:59")
+        expected = expected and calc.DEFAULT_ACCOMMODATION_FEE
+        assert calc._calculate_accommodation_fee(seg1, seg2, BASE_DATE, wait) == expected
+        assert legacy_accommodation_fee(calc, seg1, BASE_DATE, wait) == expected
+
+    def test_matches_legacy_on_time_grid(self, calc):
+        seg2 = make_segment("23:00", "23:59")
+        for arr_hour in range(24):
+            for cross in (0, 1):
+                seg1 = make_segment("06:00", f"{arr_hour:02d}:40", cross)
+                for wait in range(0, 24 * 60 + 1, 50):
+                    assert calc._calculate_accommodation_fee(seg1, seg2, BASE_DATE, wait) == \
+                        legacy_accommodation_fee(calc, seg1, BASE_DATE, wait)
+
+
+class TestTwoLegRoutes:
+    """两段中转只保留换乘可行的方案，结果与原实现逐对筛选一致"""
+
+    def test_only_feasible_routes(self, calc):
+        first = [
+            make_segment("06:00", "09:00", price=400, duration=180, number="A1"),
+            make_segment("20:00", "01:30", cross_days=1, price=600, duration=330, number="A2"),
+            make_segment("08:00", "10:00", price=0, number="A3"),
+        ]
+        second = [
+            make_segment("10:30", "12:30", price=300, number="B1"),
+            make_segment("12:00", "14:00", price=350, number="B2"),
+            make_segment("07:00", "09:00", price=320, number="B3"),
+        ]
+        parsed = {"北京_上海_flight": first, "上海_广州_flight": second}
+
+        routes = calc._calculate_two_leg_routes(parsed, "北京", "广州", ["上海"], BASE_DATE, 2)
+        got = {
+            (r.segments[0].number, r.segments[1].number): (r.transfer_wait_minutes[0], r.total_price)
+            for r in routes
+        }
+
+        expected = {}
+        for seg1 in first:
+            for seg2 in second:
+                if seg1.price <= 0 or seg2.price <= 0:
+                    continue
+                ok, wait = legacy_check_transfer(seg1, seg2, BASE_DATE, 2)
+                if ok:
+                    fee = legacy_accommodation_fee(calc, seg1, BASE_DATE, wait)
+                    expected[(seg1.number, seg2.number)] = (wait, seg1.price + seg2.price + fee)
+
+        assert got == expected
+        assert all(r.feasible for r in routes)
+        # 次日凌晨到达：换乘次日的班次，等待跨越夜间且超过阈值时计入住宿费
+        assert got[("A2", "B3")] == (330, 600 + 320)
+        assert got[("A2", "B1")] == (540, 600 + 300 + calc.DEFAULT_ACCOMMODATION_FEE)
+        assert ("A1", "B1") not in got
+
+
+class TestThreeLegRoutes:
+    """三段中转只保留两次换乘都可行的方案"""
+
+    def test_only_feasible_routes(self, calc):
+        first = [
+            make_segment("06:00", "08:00", price=300, number="A1"),
+            make_segment("21:00", "00:30", cross_days=1, price=450, number="A2"),
+        ]
+        second = [
+            make_segment("10:30", "12:00", price=200, number="B1"),
+            make_segment("09:00", "11:00", price=250, number="B2"),
+        ]
+        third = [
+            make_segment("14:00", "16:00", price=400, number="C1"),
+            make_segment("13:00", "15:00", price=380, number="C2"),
+        ]
+        parsed = {"北京_上海_flight": first, "上海_武汉_flight": second, "武汉_广州_flight": third}
+
+        routes = calc._calculate_three_leg_routes(
+            parsed, "北京", "广州", ["上海", "武汉"], BASE_DATE, 2
+        )
+        got = {
+            tuple(seg.number for seg in r.segments): (tuple(r.transfer_wait_minutes), r.total_price)
+            for r in routes
+        }
+
+        expected = {}
+        for seg1 in first:
+            for seg2 in second:
+                ok1, wait1 = legacy_check_transfer(seg1, seg2, BASE_DATE, 2)
+                if not ok1:
+                    continue
+                fee1 = legacy_accommodation_fee(calc, seg1, BASE_DATE, wait1)
+                for seg3 in third:
+                    ok2, wait2 = legacy_check_transfer(seg2, seg3, BASE_DATE, 2)
+                    if not ok2:
+                        continue
+                    fee2 = legacy_accommodation_fee(calc, seg2, BASE_DATE, wait2)
+                    price = seg1.price + seg2.price + seg3.price + fee1 + fee2
+                    expected[(seg1.number, seg2.number, seg3.number)] = ((wait1, wait2), price)
+
+        assert got == expected
+        assert ("A1", "B1", "C2") not in got
+        assert got[("A2", "B1", "C1")] == ((600, 120), 450 + 200 + 400 + calc.DEFAULT_ACCOMMODATION_FEE)